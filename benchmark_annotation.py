@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark for parallel glossary annotation.
+Annotates Emma with a small character glossary at several worker counts and reports the speed up.
+
+Usage: python benchmark_annotation.py [worker counts, default 1 2 4]
+"""
+
+import re
+import sys
+import time
+
+from src.data_manager.lemmatizer import SpacyLemmatizer
+from src.entity_management.entity_matcher_interfacer import Entity_Matcher
+
+SOURCE = "data/raw/austen_emma.txt"
+NAMES = [
+    ("Emma Woodhouse", "Emma Woodhouse"), ("Emma", "Emma"), ("Mr. Knightley", "Mr. Knightley"),
+    ("Harriet Smith", "Harriet Smith"), ("Harriet", "Harriet"), ("Mr. Elton", "Mr. Elton"),
+    ("Frank Churchill", "Frank Churchill"), ("Jane Fairfax", "Jane Fairfax"), ("Miss Bates", "Miss Bates"),
+    ("Mrs. Weston", "Mrs. Weston"), ("Highbury", "Highbury"), ("Hartfield", "Hartfield"), ("Randalls", "Randalls"),
+]
+
+
+def load_chapters():
+    with open(SOURCE, "r", encoding="utf-8") as f:
+        text = f.read()
+    # the contents page repeats the headings, real chapters are the long pieces
+    pieces = re.split(r"\n\s*CHAPTER [IVXLC]+\.?\s*\n", text)
+    chapters = [piece.strip() for piece in pieces if len(piece) > 2000]
+    return {chapter_idx: chapter.split("\n\n") for chapter_idx, chapter in enumerate(chapters, start=1)}
+
+
+def build_glossary():
+    lemmas = SpacyLemmatizer.lemmatize_entities([entity for entity, _ in NAMES], "ENGLISH")
+    return [{"entity": entity, "english target translation": translation, "lemmatized entity": lemma}
+            for (entity, translation), lemma in zip(NAMES, lemmas)]
+
+
+def run(worker_counts):
+    chapter_keyed_list = load_chapters()
+    glossary = build_glossary()
+    segment_count = sum(len(segments) for segments in chapter_keyed_list.values())
+    print(f"{len(chapter_keyed_list)} chapters, {segment_count} segments, {len(glossary)} glossary entries")
+
+    baseline = None
+    reference = None
+    for workers in worker_counts:
+        matcher = Entity_Matcher(glossary, chapter_keyed_list, target_language="ENGLISH")
+        start_time = time.perf_counter()
+        result = matcher.get_matches(workers=workers)
+        elapsed = time.perf_counter() - start_time
+
+        if reference is None:
+            reference = result
+        elif result != reference:
+            print(f"workers={workers} output differs from workers={worker_counts[0]}")
+            sys.exit(1)
+        baseline = baseline or elapsed
+        print(f"workers={workers}: {elapsed:.2f}s, {segment_count / elapsed:.0f} segments/s, "
+              f"{baseline / elapsed:.2f}x, {len(matcher.get_annotations())} hits")
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [1, 2, 4])
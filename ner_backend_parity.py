@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Parity check between the PyTorch and ONNX Runtime NER backends.
+Runs both over the sample chapters in data/raw/lotm_files and compares entity sets and speed.
+
+Usage: python ner_backend_parity.py [--quantize] [--min-overlap 0.9]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+from src.entity_management.models.hugging_ner_model import NER_Model
+
+SAMPLE_DIR = "data/raw/lotm_files"
+
+
+def load_chapters():
+    chapters = {}
+    for chapter_idx, path in enumerate(sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.txt"))), start=1):
+        with open(path, "r", encoding="utf-8") as f:
+            chapters[chapter_idx] = f.read()
+    return chapters
+
+
+def run_backend(model, chapters):
+    start_time = time.perf_counter()
+    results = model.get_entities_batch(chapters)
+    elapsed = time.perf_counter() - start_time
+    return {chapter_idx: {occurrence.surface for occurrence in occurrences} for chapter_idx, occurrences in results.items()}, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quantize", action="store_true", help="compare against the int8 ONNX model")
+    parser.add_argument("--min-overlap", type=float, default=0.9, help="lowest acceptable Jaccard overlap per chapter")
+    args = parser.parse_args()
+
+    chapters = load_chapters()
+    if not chapters:
+        print(f"No sample chapters found in {SAMPLE_DIR}")
+        sys.exit(1)
+
+    torch_entities, torch_time = run_backend(NER_Model(backend="torch"), chapters)
+    onnx_entities, onnx_time = run_backend(NER_Model(backend="onnx", quantize=args.quantize), chapters)
+
+    worst = 1.0
+    for chapter_idx in chapters:
+        expected, actual = torch_entities[chapter_idx], onnx_entities[chapter_idx]
+        union = expected | actual
+        overlap = len(expected & actual) / len(union) if union else 1.0
+        worst = min(worst, overlap)
+        print(f"chapter {chapter_idx}: overlap {overlap:.3f}, {len(expected)} torch / {len(actual)} onnx entities")
+        if expected - actual:
+            print(f"  only torch: {sorted(expected - actual)}")
+        if actual - expected:
+            print(f"  only onnx: {sorted(actual - expected)}")
+
+    print(f"torch {torch_time:.2f}s, onnx{' int8' if args.quantize else ''} {onnx_time:.2f}s "
+          f"({torch_time / onnx_time:.2f}x), worst overlap {worst:.3f}")
+    if worst < args.min_overlap:
+        print(f"Parity check failed, overlap below {args.min_overlap}")
+        sys.exit(1)
+    print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
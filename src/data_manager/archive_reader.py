@@ -0,0 +1,154 @@
+import re
+import zipfile
+import posixpath
+from html.parser import HTMLParser
+from urllib.parse import unquote
+import xml.etree.ElementTree as ET
+
+class _ParagraphExtractor(HTMLParser):
+    '''
+    Turns (X)HTML chapter documents into plain text, block elements become paragraph breaks
+    '''
+    block_tags = {"p", "div", "br", "li", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "section", "tr"}
+    skipped_tags = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.paragraphs = []
+        self.current = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.skipped_tags:
+            self.skip_depth += 1
+        elif tag in self.block_tags:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self.skipped_tags:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.block_tags:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.current.append(data)
+
+    def _flush(self):
+        paragraph = " ".join("".join(self.current).split())
+        if paragraph:
+            self.paragraphs.append(paragraph)
+        self.current = []
+
+    def get_text(self):
+        self._flush()
+        return "\n\n".join(self.paragraphs)
+
+class ArchiveReader():
+    '''
+    Reads chapters straight out of EPUB and ZIP archives without extracting them to disk
+    EPUB chapters follow spine order, ZIP entries are ordered by folder, then the given sort key (e.g. chapter number), then name
+    Entries are only decompressed when read so large archives are never fully unpacked
+    '''
+    ARCHIVE_EXTENSIONS = (".epub", ".zip")
+    TEXT_EXTENSIONS = (".txt",)
+    HTML_EXTENSIONS = (".xhtml", ".html", ".htm")
+
+    def __init__(self, archive_path, sort_key=None):
+        self.archive_path = archive_path
+        self.zip_file = zipfile.ZipFile(archive_path)
+        self.is_epub = archive_path.lower().endswith(".epub")
+        try:
+            if self.is_epub:
+                self.entries = self._spine_entries()
+            else:
+                self.entries = self._zip_entries(sort_key)
+        except Exception:
+            self.zip_file.close()
+            raise
+
+    @staticmethod
+    def is_archive(path):
+        return path.lower().endswith(ArchiveReader.ARCHIVE_EXTENSIONS)
+
+    def _spine_entries(self):
+        '''
+        Resolves META-INF/container.xml -> OPF package -> spine itemrefs into archive member names
+        '''
+        container = ET.fromstring(self.zip_file.read("META-INF/container.xml"))
+        rootfile = container.find(".//{*}rootfile")
+        if rootfile is None:
+            raise ValueError(f"EPUB {self.archive_path} has no rootfile in its container")
+        opf_path = rootfile.get("full-path")
+        opf_dir = posixpath.dirname(opf_path)
+        package = ET.fromstring(self.zip_file.read(opf_path))
+
+        manifest = {}
+        for item in package.iterfind(".//{*}manifest/{*}item"):
+            # EPUB3 navigation documents are tables of contents, not chapters
+            if "nav" in item.get("properties", "").split():
+                continue
+            manifest[item.get("id")] = (item.get("href"), item.get("media-type", ""))
+
+        entries = []
+        for itemref in package.iterfind(".//{*}spine/{*}itemref"):
+            if itemref.get("linear", "yes") == "no":
+                continue
+            href, media_type = manifest.get(itemref.get("idref"), (None, ""))
+            if not href or "html" not in media_type:
+                continue
+            entries.append(posixpath.normpath(posixpath.join(opf_dir, unquote(href))))
+        return entries
+
+    def _zip_entries(self, sort_key):
+        names = [
+            info.filename for info in self.zip_file.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(self.TEXT_EXTENSIONS + self.HTML_EXTENSIONS)
+            and not posixpath.basename(info.filename).startswith(".")
+        ]
+        # "Vol 1/Chapter 1.txt" and "Vol 2/Chapter 1.txt" share a chapter number, so the folder is compared first
+        if sort_key is None:
+            return sorted(names, key=lambda name: (self.natural_key(posixpath.dirname(name)), self.natural_key(name)))
+        return sorted(names, key=lambda name: (self.natural_key(posixpath.dirname(name)), sort_key(name), self.natural_key(name)))
+
+    @staticmethod
+    def natural_key(text):
+        '''
+        Sort key comparing digit runs as numbers, so "Vol 2" comes before "Vol 10"
+        '''
+        return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", text)]
+
+    def entry_info(self, name):
+        return self.zip_file.getinfo(name)
+
+    def read_entry(self, name):
+        '''
+        Decompresses a single entry and returns it as plain text
+        '''
+        raw = self.zip_file.read(name).decode("utf-8", errors="replace")
+        if self.is_epub or name.lower().endswith(self.HTML_EXTENSIONS):
+            extractor = _ParagraphExtractor()
+            extractor.feed(raw)
+            extractor.close()
+            return extractor.get_text()
+        return raw
+
+    @staticmethod
+    def has_text(text):
+        '''
+        False for cover pages, image only pages etc. which shouldn't become chapters
+        '''
+        return re.search(r"\w", text) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        self.zip_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
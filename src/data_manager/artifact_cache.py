@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import defaultdict
+
+class ArtifactCache():
+    '''
+    Content addressed on-disk cache for per-chapter stage outputs (lemmatized text, resolved chunks)
+    Entries are keyed by stage + chapter content hash + language + model name/version,
+    so editing a chapter or upgrading a model only misses for what actually changed
+    '''
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS artifacts (
+        stage TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        language TEXT NOT NULL,
+        model_name TEXT NOT NULL,
+        model_version TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (stage, content_hash, language, model_name, model_version)
+    )
+    """
+
+    def __init__(self, db_path):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute(self.SCHEMA)
+        self.connection.commit()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def language_key(language):
+        # lingua Language enums and plain strings both reduce to a stable name
+        if language is None:
+            return "UNKNOWN"
+        return getattr(language, "name", str(language))
+
+    def get(self, stage, content_hash, language, model_name, model_version):
+        '''
+        Returns the cached payload or None, counting the hit/miss against the stage
+        '''
+        row = self.connection.execute(
+            "SELECT payload FROM artifacts WHERE stage=? AND content_hash=? AND language=? AND model_name=? AND model_version=?",
+            (stage, content_hash, self.language_key(language), model_name, model_version)
+        ).fetchone()
+        if row is None:
+            self.misses[stage] += 1
+            return None
+        self.hits[stage] += 1
+        return json.loads(row[0])
+
+    def put(self, stage, content_hash, language, model_name, model_version, payload):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (stage, content_hash, self.language_key(language), model_name, model_version,
+             json.dumps(payload, ensure_ascii=False), time.time())
+        )
+        self.connection.commit()
+
+    def invalidate(self, model_name, model_version=None):
+        '''
+        Drops every entry produced by a model, or only by one version of it
+        Returns the number of removed entries
+        '''
+        if model_version is None:
+            cursor = self.connection.execute("DELETE FROM artifacts WHERE model_name=?", (model_name,))
+        else:
+            cursor = self.connection.execute(
+                "DELETE FROM artifacts WHERE model_name=? AND model_version=?", (model_name, model_version)
+            )
+        self.connection.commit()
+        return cursor.rowcount
+
+    def prune_stale_versions(self, model_name, current_version):
+        '''
+        Drops entries of a model made by any version other than the current one
+        '''
+        cursor = self.connection.execute(
+            "DELETE FROM artifacts WHERE model_name=? AND model_version!=?", (model_name, current_version)
+        )
+        self.connection.commit()
+        if cursor.rowcount:
+            self.logger.info(f"Pruned {cursor.rowcount} stale cache entries for {model_name}")
+        return cursor.rowcount
+
+    def stats(self):
+        stages = set(self.hits) | set(self.misses)
+        return {stage: {"hits": self.hits[stage], "misses": self.misses[stage]} for stage in sorted(stages)}
+
+    def report(self):
+        for stage, counts in self.stats().items():
+            self.logger.info(f"Artifact cache [{stage}]: {counts['hits']} hits, {counts['misses']} misses")
+        return self.stats()
+
+    def close(self):
+        self.connection.close()
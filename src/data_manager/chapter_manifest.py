@@ -0,0 +1,64 @@
+import os
+import json
+import logging
+
+class ChapterManifest():
+    '''
+    Persisted record of every chapter seen by the pipeline: its content hash and the stages it has completed
+    Lets a run over a growing serial pick out appended or edited chapters instead of reprocessing the whole book
+    '''
+    def __init__(self, manifest_path):
+        self.logger = logging.getLogger(__name__)
+        self.manifest_path = manifest_path
+        self.chapters = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # json keys are strings, chapter indices are ints everywhere else
+            self.chapters = {int(key): value for key, value in data.get("chapters", {}).items()}
+
+    def changed_chapters(self, chapter_hashes):
+        '''
+        Chapter indices that are new or whose content hash differs from the recorded one
+        '''
+        return [
+            chapter_idx for chapter_idx, content_hash in chapter_hashes.items()
+            if self.chapters.get(chapter_idx, {}).get("hash") != content_hash
+        ]
+
+    def removed_chapters(self, chapter_hashes):
+        return [chapter_idx for chapter_idx in self.chapters if chapter_idx not in chapter_hashes]
+
+    def pending_chapters(self, chapter_hashes, stage):
+        '''
+        Chapter indices that still have to go through a stage, either changed or never completed it
+        '''
+        changed = set(self.changed_chapters(chapter_hashes))
+        return [
+            chapter_idx for chapter_idx in chapter_hashes
+            if chapter_idx in changed or stage not in self.chapters.get(chapter_idx, {}).get("stages", [])
+        ]
+
+    def update_hashes(self, chapter_hashes):
+        '''
+        Records new hashes, a chapter whose content changed loses its completed stages
+        '''
+        for chapter_idx in self.changed_chapters(chapter_hashes):
+            self.chapters[chapter_idx] = {"hash": chapter_hashes[chapter_idx], "stages": []}
+        for chapter_idx in self.removed_chapters(chapter_hashes):
+            del self.chapters[chapter_idx]
+
+    def mark_stage(self, chapter_indices, stage):
+        for chapter_idx in chapter_indices:
+            stages = self.chapters.setdefault(chapter_idx, {"hash": None, "stages": []})["stages"]
+            if stage not in stages:
+                stages.append(stage)
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        # write then swap so a crash mid save never leaves a truncated manifest
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"chapters": {str(key): value for key, value in sorted(self.chapters.items())}}, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+        self.logger.info(f"Saved chapter manifest with {len(self.chapters)} chapters to {self.manifest_path}")
@@ -28,11 +28,13 @@ class CoreferenceResolver():
     # CorPipe configuration
     CORPIPE_DIR = "/Users/td/Documents/GitHub/FinetunedMTLBot/crac2024-corpipe"
     CORPIPE_PYTHON_ENV = "/Users/td/Documents/GitHub/FinetunedMTLBot/.venv_corpipe/bin/python"
+    MODEL_NAME = "corpipe24-corefud1.2-240906"
+    MODEL_VERSION = "1.2-240906"
 
     @staticmethod
     def model_available(language: Language):
         """Check if coreference resolution is available for the given language."""
-        model_path = os.path.join(CoreferenceResolver.CORPIPE_DIR, "corpipe24-corefud1.2-240906/model.h5")
+        model_path = os.path.join(CoreferenceResolver.CORPIPE_DIR, CoreferenceResolver.MODEL_NAME, "model.h5")
         return language in CoreferenceResolver.available_models and os.path.exists(model_path)
     
     @staticmethod
@@ -349,7 +351,7 @@ class CoreferenceResolver():
             
             if result.returncode == 0:
                 # Look for output in the model directory
-                model_dir = os.path.join(CoreferenceResolver.CORPIPE_DIR, "corpipe24-corefud1.2-240906")
+                model_dir = os.path.join(CoreferenceResolver.CORPIPE_DIR, CoreferenceResolver.MODEL_NAME)
                 if os.path.exists(model_dir):
                     output_files = [f for f in os.listdir(model_dir) if f.endswith('.conllu')]
                     if output_files:
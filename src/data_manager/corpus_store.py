@@ -0,0 +1,148 @@
+import os
+import json
+import mmap
+from array import array
+from collections.abc import Mapping, Sequence
+
+PARAGRAPH_SEPARATOR = "\n\n"
+
+class ChapterView(Sequence):
+    '''
+    Lazy sequence of the paragraphs of one chapter, paragraphs are only decoded when accessed
+    '''
+    def __init__(self, store, chapter_idx, first, count):
+        self.store = store
+        self.chapter_idx = chapter_idx
+        self.first = first
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(f"paragraph {i} out of range for chapter {self.chapter_idx}")
+        return self.store.paragraph_bytes(self.chapter_idx, i).tobytes().decode("utf-8")
+
+class CorpusStore(Mapping):
+    '''
+    Packed corpus, one UTF-8 blob holding every chapter plus an offset index (chapter -> paragraph -> byte range)
+    The blob is memory mapped so paragraph access is a slice of the mapping rather than a held python str
+    Behaves like a read only chunked chapter dic, chapter_idx -> sequence of paragraphs
+    '''
+    BLOB_FILE = "corpus.bin"
+    PARAGRAPH_INDEX_FILE = "paragraphs.idx"
+    CHAPTER_INDEX_FILE = "chapters.json"
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, self.CHAPTER_INDEX_FILE), "r", encoding="utf-8") as f:
+            chapter_index = json.load(f)
+        self.signature = chapter_index.get("signature")
+        # chapter_idx -> (first paragraph row, paragraph count)
+        self.chapters = {chapter_idx: (first, count) for chapter_idx, first, count in chapter_index["chapters"]}
+
+        # paragraph rows are flat (start, end) byte offset pairs
+        self.offsets = array("q")
+        with open(os.path.join(store_dir, self.PARAGRAPH_INDEX_FILE), "rb") as f:
+            self.offsets.frombytes(f.read())
+
+        self._blob_file = open(os.path.join(store_dir, self.BLOB_FILE), "rb")
+        if os.fstat(self._blob_file.fileno()).st_size:
+            self._mmap = mmap.mmap(self._blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.blob = memoryview(self._mmap)
+        else:
+            self._mmap = None
+            self.blob = memoryview(b"")
+
+    @classmethod
+    def build(cls, store_dir, chunked_chapters, signature=None):
+        '''
+        Writes the store from (chapter_idx, paragraphs) pairs or a chunked chapter dic
+        Chapters are written as they arrive so a streaming iterator never has to be held in memory
+        '''
+        if isinstance(chunked_chapters, Mapping):
+            chunked_chapters = chunked_chapters.items()
+        os.makedirs(store_dir, exist_ok=True)
+
+        chapters = []
+        offsets = array("q")
+        position = 0
+        separator = PARAGRAPH_SEPARATOR.encode("utf-8")
+        with open(os.path.join(store_dir, cls.BLOB_FILE), "wb") as blob_file:
+            for chapter_idx, paragraphs in chunked_chapters:
+                first = len(offsets) // 2
+                for i, paragraph in enumerate(paragraphs):
+                    # paragraphs keep their original separator so a chapter is one contiguous slice
+                    if i:
+                        blob_file.write(separator)
+                        position += len(separator)
+                    encoded = str(paragraph).encode("utf-8")
+                    blob_file.write(encoded)
+                    offsets.append(position)
+                    offsets.append(position + len(encoded))
+                    position += len(encoded)
+                chapters.append([chapter_idx, first, len(offsets) // 2 - first])
+
+        with open(os.path.join(store_dir, cls.PARAGRAPH_INDEX_FILE), "wb") as f:
+            offsets.tofile(f)
+        with open(os.path.join(store_dir, cls.CHAPTER_INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({"signature": signature, "chapters": chapters}, f)
+        return cls(store_dir)
+
+    @classmethod
+    def exists(cls, store_dir):
+        return all(
+            os.path.exists(os.path.join(store_dir, name))
+            for name in (cls.BLOB_FILE, cls.PARAGRAPH_INDEX_FILE, cls.CHAPTER_INDEX_FILE)
+        )
+
+    def _row_range(self, row):
+        return self.offsets[2 * row], self.offsets[2 * row + 1]
+
+    def paragraph_range(self, chapter_idx, paragraph_idx):
+        '''
+        Byte range of a paragraph within the blob
+        '''
+        first, count = self.chapters[chapter_idx]
+        if not 0 <= paragraph_idx < count:
+            raise IndexError(f"paragraph {paragraph_idx} out of range for chapter {chapter_idx}")
+        return self._row_range(first + paragraph_idx)
+
+    def paragraph_bytes(self, chapter_idx, paragraph_idx):
+        '''
+        Zero copy view of a paragraph's UTF-8 bytes
+        '''
+        start, end = self.paragraph_range(chapter_idx, paragraph_idx)
+        return self.blob[start:end]
+
+    def paragraph(self, chapter_idx, paragraph_idx):
+        return self.paragraph_bytes(chapter_idx, paragraph_idx).tobytes().decode("utf-8")
+
+    def chapter_text(self, chapter_idx):
+        first, count = self.chapters[chapter_idx]
+        if not count:
+            return ""
+        start = self._row_range(first)[0]
+        end = self._row_range(first + count - 1)[1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def __getitem__(self, chapter_idx):
+        first, count = self.chapters[chapter_idx]
+        return ChapterView(self, chapter_idx, first, count)
+
+    def __iter__(self):
+        return iter(self.chapters)
+
+    def __len__(self):
+        return len(self.chapters)
+
+    def close(self):
+        self.blob.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._blob_file.close()
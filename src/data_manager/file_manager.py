@@ -1,51 +1,197 @@
 import os
-import json
 import re
 import sys
 from collections import defaultdict
+from dataclasses import dataclass
+from typing import List, Optional
 import logging
 
+from ..utils.language_detector import LanguageDetector
+from .archive_reader import ArchiveReader
+from .text_span import TextSpan
+from .lemma_alignment import LemmaAlignment
+
 # Add the utils directory to the path for imports
 current_dir = os.path.dirname(os.path.abspath(__file__))
 utils_dir = os.path.join(current_dir, '..', 'utils')
 sys.path.append(utils_dir)
 
+@dataclass
+class ChapterRecord:
+    '''
+    One chapter of every stage 1 output, yielded lazily in streaming mode
+    '''
+    chapter_idx: int
+    text: str
+    lemmatized_text: Optional[str] = None
+    lemma_alignment: Optional[LemmaAlignment] = None
+    resolved_chunks: Optional[List[TextSpan]] = None
+    language: Optional[object] = None
+
 class FileManager():
-    def __init__(self, directory_path, start_idx):
+    def __init__(self, directory_path, start_idx=0, use_cache=True, cache_path=None, streaming=False,
+                 lemmatize_batch_size=16, lemmatize_n_process=1, tag_chapter_languages=False):
         self.logger = logging.getLogger(__name__)
         # Get project root dynamically
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
+        self.start_idx = start_idx
+        self.streaming = streaming
+        self.lemmatize_batch_size = lemmatize_batch_size
+        self.lemmatize_n_process = lemmatize_n_process
+        self.tag_chapter_languages = tag_chapter_languages
+        self.chapter_languages = {}  # optional per chapter language tags for mixed language uploads
+        self._pruned_models = set()
+        self._coreference_warned = False
+
+        # Content addressed cache for lemmatized and resolved chapters, reruns only process edited chapters
+        self.artifact_cache = None
+        if use_cache:
+            from .artifact_cache import ArtifactCache
+            if cache_path is None:
+                cache_path = os.path.join(self.project_root, "data", "cache", "artifacts.sqlite")
+            self.artifact_cache = ArtifactCache(cache_path)
         
         # Constructs list of files
         file_list = self._find_files(directory_path)
         
         # Sort files by chapter number
-        sorted_files = self._sort_files_by_chapter(file_list)
+        self.sorted_files = self._sort_files_by_chapter(file_list)
+
+        # EPUB/ZIP archives are expanded in place into (archive, entry) sources, read lazily without extracting
+        # entries without text are only dropped when read, so chapter indices are assigned by _iter_chapter_texts
+        self._archives = {}
+        self.sorted_files = self._expand_archives(self.sorted_files)
+
+        if streaming:
+            # Nothing is held for the whole corpus, chapters are produced by iter_chapters
+            self.chapter_dic = None
+            self.lemmatized_chapter_dic = None
+            self.lemma_alignment_dic = None
+            self.resolved_chunked_chapter_dic = None
+            self.language, self.language_confidence = self._detect_language() if self.sorted_files else (None, 0.0)
+            return
 
         # Create chapter indexed dictionary
-        self.chapter_dic = self._create_chapter_dic(sorted_files, start_idx)
+        self.chapter_dic = self._create_chapter_dic()
 
         # Find language
-        self.language = self._detect_language()
+        self.language, self.language_confidence = self._detect_language()
+        if tag_chapter_languages:
+            self.chapter_languages = LanguageDetector.tag_chapters(self.chapter_dic)
 
         # Lemmatise using found language
         self.lemmatized_chapter_dic = self._create_lemmatized_chapter_dic()
 
         # Chunk by paragraphs and use coreference resolution if available
         self.resolved_chunked_chapter_dic = self._resolve_chunk_chapter_dic()
+
+        if self.artifact_cache:
+            self.artifact_cache.report()
+
+    def iter_chapters(self, lemmatize=True, resolve=True, chapter_indices=None):
+        '''
+        Yields a ChapterRecord per chapter in chapter order, reading and processing one chapter at a time
+        so memory stays bounded by the largest chapter rather than the whole novel
+        chapter_indices restricts it to a subset, e.g. only the new chapters of an incremental run
+        '''
+        wanted = set(chapter_indices) if chapter_indices is not None else None
+        for chapter_idx, text in self._iter_chapter_texts():
+            if wanted is not None and chapter_idx not in wanted:
+                continue
+            if self.tag_chapter_languages:
+                self.chapter_languages[chapter_idx] = LanguageDetector.detect(text)
+            record = ChapterRecord(chapter_idx=chapter_idx, text=text, language=self._chapter_language(chapter_idx))
+            if lemmatize:
+                record.lemmatized_text, record.lemma_alignment = self._lemmatize_chapter_aligned(chapter_idx, text)
+            if resolve:
+                record.resolved_chunks = self._resolve_chunk_chapter(chapter_idx, text)
+            yield record
+        if self.artifact_cache:
+            self.artifact_cache.report()
+    
+    def chapter_hashes(self):
+        '''
+        Content hash of every chapter keyed by chapter index, reads raw text only
+        '''
+        from .artifact_cache import ArtifactCache
+        return {chapter_idx: ArtifactCache.content_hash(text) for chapter_idx, text in self._iter_chapter_texts()}
+
+    def build_corpus_store(self, store_dir):
+        '''
+        Packs the resolved paragraph chunks into a memory mapped CorpusStore for later stages to slice from
+        An existing store is reused when neither the source files nor the resolution settings changed since it was built
+        '''
+        from .corpus_store import CorpusStore
+
+        signature = self._source_signature(self._resolution_settings())
+        if CorpusStore.exists(store_dir):
+            corpus_store = CorpusStore(store_dir)
+            if corpus_store.signature == signature:
+                self.logger.info(f"Reusing corpus store at {store_dir}")
+                return corpus_store
+            corpus_store.close()
+
+        if self.streaming:
+            chunked_chapters = (
+                (record.chapter_idx, record.resolved_chunks)
+                for record in self.iter_chapters(lemmatize=False, resolve=True)
+            )
+        else:
+            chunked_chapters = self.resolved_chunked_chapter_dic
+        corpus_store = CorpusStore.build(store_dir, chunked_chapters, signature)
+        self.logger.info(f"Built corpus store with {len(corpus_store)} chapters at {store_dir}")
+        return corpus_store
+
+    def _resolution_settings(self):
+        '''
+        What the stored resolved text depends on besides the sources, language -> coreference model (name, version)
+        Languages without a coreference model map to None, their chapters are stored unresolved
+        '''
+        from .coreference_resolver import CoreferenceResolver
+        from .artifact_cache import ArtifactCache
+
+        languages = {self.language} | set(self.chapter_languages.values())
+        settings = {}
+        for language in languages:
+            if CoreferenceResolver.model_available(language):
+                settings[ArtifactCache.language_key(language)] = [CoreferenceResolver.MODEL_NAME, CoreferenceResolver.MODEL_VERSION]
+            else:
+                settings[ArtifactCache.language_key(language)] = None
+        return settings
+
+    def _source_signature(self, settings=None):
+        '''
+        Cheap fingerprint of the inputs (names, sizes, mtimes), avoids rereading files to validate a store
+        settings (e.g. the language and coreference model) are folded in, a change to them invalidates the store too
+        '''
+        import hashlib
+        digest = hashlib.sha256(str(self.start_idx).encode("utf-8"))
+        digest.update(repr(sorted((settings or {}).items())).encode("utf-8"))
+        for file in self.sorted_files:
+            if isinstance(file, tuple):
+                archive_path, entry = file
+                info = self._archives[archive_path].entry_info(entry)
+                digest.update(f"{os.path.basename(archive_path)}/{entry}:{info.file_size}:{info.CRC}".encode("utf-8"))
+                continue
+            stat = os.stat(file)
+            digest.update(f"{os.path.basename(file)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        return digest.hexdigest()
     
     def _find_files(self,directory_path):
         '''
-        Find the files from the given directory
+        Find the files from the given directory, the path may also be a single EPUB/ZIP archive
         '''
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
+
+        if os.path.isfile(directory_path) and ArchiveReader.is_archive(directory_path):
+            return [directory_path]
         
         file_list = []
         try:
             for filename in os.listdir(directory_path):
-                if filename.endswith(".txt"):
+                if filename.endswith(".txt") or ArchiveReader.is_archive(filename):
                     file_list.append(os.path.join(directory_path, filename))
         except (FileNotFoundError, PermissionError) as e:
             print(f"Critical error: {e}")
@@ -55,91 +201,168 @@ class FileManager():
         """
         Sort files by chapter number extracted from filename.
         """
-        def extract_chapter_number(file_path):
-            filename = os.path.basename(file_path)
-            
-            # Pattern 1: Extract numbers from filename (e.g., lotm1.txt -> 1)
-            numbers = re.findall(r'\d+', filename)
-            if numbers:
-                # Take the first number found, assuming it's the chapter number
-                return int(numbers[0])
-            
-            # Pattern 2: If no numbers found, sort alphabetically
-            return float('inf')  # Put files without numbers at the end
-        
         try:
-            sorted_files = sorted(file_list, key=extract_chapter_number)
+            sorted_files = sorted(file_list, key=self._extract_chapter_number)
             print(f"Sorted {len(sorted_files)} files by chapter number")
             return sorted_files
         except Exception as e:
             print(f"Warning: Failed to sort files by chapter, using alphabetical sort: {e}")
             return sorted(file_list)
 
-    def _create_chapter_dic(self, sorted_files, start_idx):
+    @staticmethod
+    def _extract_chapter_number(file_path):
+        filename = os.path.basename(file_path)
+        
+        # Pattern 1: Extract numbers from filename (e.g., lotm1.txt -> 1)
+        numbers = re.findall(r'\d+', filename)
+        if numbers:
+            # Take the first number found, assuming it's the chapter number
+            return int(numbers[0])
+        
+        # Pattern 2: If no numbers found, sort alphabetically
+        return float('inf')  # Put files without numbers at the end
+
+    def _expand_archives(self, sorted_files):
+        '''
+        Replaces each archive with its entries (EPUB spine order, ZIP entries by folder then chapter number)
+        Only the archive directories are read here, entries are decompressed when the chapter is read
+        '''
+        sources = []
+        for file in sorted_files:
+            if not ArchiveReader.is_archive(file):
+                sources.append(file)
+                continue
+            try:
+                archive = ArchiveReader(file, sort_key=self._extract_chapter_number)
+            except Exception as e:
+                self.logger.warning(f"Could not open archive {file}: {e}")
+                continue
+            self._archives[file] = archive
+            sources.extend((file, entry) for entry in archive.entries)
+            self.logger.info(f"Found {len(archive)} entries in archive {file}")
+        return sources
+
+    def _iter_chapter_texts(self):
+        '''
+        (chapter_idx, text) in chapter order, one source is read at a time
+        Archive entries without text (cover and image only pages) are skipped without taking a chapter index
+        '''
+        chapter_idx = self.start_idx
+        for file in self.sorted_files:
+            text = self._read_chapter(file)
+            if isinstance(file, tuple) and not ArchiveReader.has_text(text):
+                continue
+            yield chapter_idx, text
+            chapter_idx += 1
+
+    def close(self):
+        '''
+        Closes the open archives and the artifact cache
+        '''
+        for archive in self._archives.values():
+            archive.close()
+        self._archives = {}
+        if self.artifact_cache:
+            self.artifact_cache.close()
+            self.artifact_cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _create_chapter_dic(self):
         '''
         chapters indexed by chapter index
         '''
-        chapter_dic = {}
-        for i, file in enumerate(sorted_files):
-            with open(file,'r',encoding='UTF-8') as f:
-                chapter_dic[start_idx+i] = f.read()
-        return chapter_dic
+        return dict(self._iter_chapter_texts())
+
+    def _read_chapter(self, file):
+        if isinstance(file, tuple):
+            archive_path, entry = file
+            return self._archives[archive_path].read_entry(entry)
+        with open(file,'r',encoding='UTF-8') as f:
+            return f.read()
     
     def _resolve_chunk_chapter_dic(self):
         '''
         Coreference resolution if available + chunking
         '''
+        return {key: self._resolve_chunk_chapter(key, chapter_text) for key, chapter_text in self.chapter_dic.items()}
+
+    def _resolve_chunk_chapter(self, key, chapter_text):
         from .coreference_resolver import CoreferenceResolver
-        
-        if CoreferenceResolver.model_available(self.language):
-            self.logger.info(f"Coreference resolution available for {self.language}, applying resolution...")
-            
-            # Apply coreference resolution to each chapter
-            resolved_chapter_dic = {}
-            for key, chapter_text in self.chapter_dic.items():
-                try:
-                    resolved_text = CoreferenceResolver.resolve_coreferences(chapter_text, self.language)
-                    resolved_chapter_dic[key] = resolved_text
-                    self.logger.debug(f"Applied coreference resolution to chapter {key}")
-                except Exception as e:
-                    self.logger.warning(f"Coreference resolution failed for chapter {key}: {e}")
-                    resolved_chapter_dic[key] = chapter_text  # Use original if resolution fails
-            
-            # Chunk the resolved text
-            return self._chunk_chapter_dic(resolved_chapter_dic)
-            
-        else:
-            self.logger.warning(
-                f"No coreference resolution available for {self.language} language, proceeding without. May result in worse triplet extraction"
-            )
+
+        language = self._chapter_language(key)
+        if not CoreferenceResolver.model_available(language):
+            if not self._coreference_warned:
+                self.logger.warning(
+                    f"No coreference resolution available for {language} language, proceeding without. May result in worse triplet extraction"
+                )
+                self._coreference_warned = True
             # System is still compatible without coreference resolution
-            return self._chunk_chapter_dic(self.chapter_dic)
+            return self._chunk_text(chapter_text, key)
+
+        model_name, model_version = CoreferenceResolver.MODEL_NAME, CoreferenceResolver.MODEL_VERSION
+        if model_name not in self._pruned_models:
+            self.logger.info(f"Coreference resolution available for {language}, applying resolution...")
+        self._prune_stale_once(model_name, model_version)
+
+        content_hash = self._cache_lookup_hash(chapter_text)
+        # the resolved text is cached, chunk spans are cheap to rebuild on top of it
+        cached = self._cache_get("resolved_text", content_hash, model_name, model_version, language)
+        if cached is not None:
+            return self._chunk_text(cached, key)
+        try:
+            resolved_text = CoreferenceResolver.resolve_coreferences(chapter_text, language)
+            self._cache_put("resolved_text", content_hash, model_name, model_version, language, resolved_text)
+            self.logger.debug(f"Applied coreference resolution to chapter {key}")
+            return self._chunk_text(resolved_text, key)
+        except Exception as e:
+            self.logger.warning(f"Coreference resolution failed for chapter {key}: {e}")
+            return self._chunk_text(chapter_text, key)  # Use original if resolution fails
         
-    def _chunk_chapter_dic(self,chapter_dic):
-        return {key:value.split("\n\n") for key,value in chapter_dic.items()}
+    def _chunk_text(self, text, chapter_idx):
+        '''
+        Paragraph spans pointing into the chapter text, offsets are kept and nothing is copied until read
+        '''
+        return TextSpan.split(chapter_idx, text)
 
     def _detect_language(self):
         '''
-        Builds a language detector and detects from that list
+        Detects the corpus language from fixed size samples of a few chapters, cost doesn't grow with chapter length
+        Returns (language, confidence)
         '''
-        from lingua import Language, LanguageDetectorBuilder
-
-        languages = [
-            Language.ENGLISH, 
-            Language.CHINESE, 
-            Language.JAPANESE, 
-            Language.KOREAN, 
-            Language.SPANISH, 
-            Language.FRENCH
-        ]
+        if self.chapter_dic:
+            texts = list(self.chapter_dic.values())
+        else:
+            # streaming, only read a window out of a few evenly spaced files
+            step = max(1, len(self.sorted_files) // LanguageDetector.SAMPLE_TEXTS)
+            texts = [self._read_chapter_sample(file) for file in self.sorted_files[::step][:LanguageDetector.SAMPLE_TEXTS]]
 
-        detector = LanguageDetectorBuilder.from_languages(*languages).build()
+        language, confidence = LanguageDetector.detect_sampled(texts)
+        self.logger.info(f"Detected language {language} with confidence {confidence:.2f}")
+        return language, confidence
 
-        chapter = next(iter(self.chapter_dic.values()))
+    def _read_chapter_sample(self, file, sample_chars=LanguageDetector.SAMPLE_CHARS):
+        if isinstance(file, tuple):
+            # archive entries are decompressed whole, the detector still only looks at a window
+            return self._read_chapter(file)
+        # up to 4 bytes per character in UTF-8, a partially read character at the edges is dropped
+        size = os.path.getsize(file)
+        with open(file, 'rb') as f:
+            f.seek(max(0, size // 2 - sample_chars * 2))
+            return f.read(sample_chars * 4).decode('utf-8', errors='ignore')
 
-        return detector.detect_language_of(chapter)
+    def _chapter_language(self, key):
+        return self.chapter_languages.get(key) or self.language
 
     def _create_lemmatized_chapter_dic(self):
+        '''
+        Lemmatizes every chapter, the lemma alignment of each is kept in self.lemma_alignment_dic
+        '''
+        self.lemma_alignment_dic = {}
         try:
             from .lemmatizer import SpacyLemmatizer
         except ImportError:
@@ -147,11 +370,107 @@ class FileManager():
             self.logger.warning("SpacyLemmatizer not available, using original text")
             return self.chapter_dic.copy()
 
+        # Serve what the cache has, then batch every miss through one nlp.pipe run per language
         lemmatized_chapter_dic = {}
-        for key in self.chapter_dic:
+        misses_by_language = defaultdict(list)
+        for key, text in self.chapter_dic.items():
+            language = self._chapter_language(key)
+            try:
+                model_name, model_version = SpacyLemmatizer.model_identity(language)
+            except ValueError:
+                # undetectable (e.g. empty or numeric only) or unsupported language, the chapter stays unlemmatized
+                self.logger.warning(f"No spaCy model for language {language} of chapter {key}, using original text")
+                lemmatized_chapter_dic[key] = text
+                continue
+            self._prune_stale_once(model_name, model_version)
+            cached = self._cache_get("lemmatized_aligned", self._cache_lookup_hash(text), model_name, model_version, language)
+            if cached is not None:
+                lemmatized_chapter_dic[key] = cached["text"]
+                self.lemma_alignment_dic[key] = LemmaAlignment.from_list(cached["alignment"])
+            else:
+                misses_by_language[language].append(key)
+
+        for language, misses in misses_by_language.items():
+            model_name, model_version = SpacyLemmatizer.model_identity(language)
             try:
-                lemmatized_chapter_dic[key] = SpacyLemmatizer.lemmatize_text(self.chapter_dic[key])
+                lemmatized_texts = SpacyLemmatizer.lemmatize_texts(
+                    (self.chapter_dic[key] for key in misses),
+                    language,
+                    batch_size=self.lemmatize_batch_size,
+                    n_process=self.lemmatize_n_process,
+                    aligned=True
+                )
+                for key, (lemmatized_text, alignment) in zip(misses, lemmatized_texts):
+                    lemmatized_chapter_dic[key] = lemmatized_text
+                    self.lemma_alignment_dic[key] = alignment
+                    self._cache_put("lemmatized_aligned", self._cache_lookup_hash(self.chapter_dic[key]), model_name, model_version, language,
+                                    {"text": lemmatized_text, "alignment": alignment.to_list()})
             except Exception as e:
-                self.logger.warning(f"Lemmatization failed for chapter {key}: {e}")
-                lemmatized_chapter_dic[key] = self.chapter_dic[key]  # Use original text
-        return lemmatized_chapter_dic
\ No newline at end of file
+                self.logger.warning(f"Batch lemmatization failed, falling back to per chapter: {e}")
+                for key in misses:
+                    if key not in lemmatized_chapter_dic:
+                        lemmatized_chapter_dic[key], alignment = self._lemmatize_chapter_aligned(key, self.chapter_dic[key])
+                        if alignment is not None:
+                            self.lemma_alignment_dic[key] = alignment
+
+        # keep chapter order
+        return {key: lemmatized_chapter_dic[key] for key in self.chapter_dic}
+
+    def _lemmatize_chapter_aligned(self, key, text):
+        '''
+        (lemmatized text, LemmaAlignment), the alignment is None when the text couldn't be lemmatized
+        '''
+        try:
+            from .lemmatizer import SpacyLemmatizer
+        except ImportError:
+            # Fallback if lemmatizer is not available
+            self.logger.warning("SpacyLemmatizer not available, using original text")
+            return text, None
+
+        language = self._chapter_language(key)
+        try:
+            model_name, model_version = SpacyLemmatizer.model_identity(language)
+        except ValueError:
+            self.logger.warning(f"No spaCy model for language {language} of chapter {key}, using original text")
+            return text, None
+        self._prune_stale_once(model_name, model_version)
+
+        content_hash = self._cache_lookup_hash(text)
+        cached = self._cache_get("lemmatized_aligned", content_hash, model_name, model_version, language)
+        if cached is not None:
+            return cached["text"], LemmaAlignment.from_list(cached["alignment"])
+        try:
+            lemmatized_text, alignment = SpacyLemmatizer.lemmatize_text_aligned(text, language)
+            self._cache_put("lemmatized_aligned", content_hash, model_name, model_version, language,
+                            {"text": lemmatized_text, "alignment": alignment.to_list()})
+            return lemmatized_text, alignment
+        except Exception as e:
+            self.logger.warning(f"Lemmatization failed for chapter {key}: {e}")
+            return text, None  # Use original text
+
+    def _prune_stale_once(self, model_name, model_version):
+        if model_name in self._pruned_models:
+            return
+        if self.artifact_cache:
+            self.artifact_cache.prune_stale_versions(model_name, model_version)
+        self._pruned_models.add(model_name)
+
+    def _cache_lookup_hash(self, text):
+        return self.artifact_cache.content_hash(text) if self.artifact_cache else None
+
+    def _cache_get(self, stage, content_hash, model_name, model_version, language):
+        if not self.artifact_cache:
+            return None
+        return self.artifact_cache.get(stage, content_hash, language, model_name, model_version)
+
+    def _cache_put(self, stage, content_hash, model_name, model_version, language, payload):
+        if self.artifact_cache:
+            self.artifact_cache.put(stage, content_hash, language, model_name, model_version, payload)
+
+    def invalidate_cache(self, model_name, model_version=None):
+        '''
+        Drops cached artifacts of a model (optionally one version), e.g. after retraining CorPipe
+        '''
+        if not self.artifact_cache:
+            return 0
+        return self.artifact_cache.invalidate(model_name, model_version)
\ No newline at end of file
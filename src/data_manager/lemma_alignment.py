@@ -0,0 +1,61 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+class LemmaAlignment():
+    '''
+    Maps each lemma token of a lemmatized chapter back to the source characters it came from
+    Four parallel array('q') columns, lemma_starts/lemma_ends index the lemmatized text, source_starts/source_ends the chapter
+    Lets spans found on the base text (e.g. NER hits) be projected onto the lemmatized view without another model pass
+    '''
+    COLUMNS = 4
+
+    def __init__(self, lemma_starts=None, lemma_ends=None, source_starts=None, source_ends=None):
+        self.lemma_starts = array("q", lemma_starts or [])
+        self.lemma_ends = array("q", lemma_ends or [])
+        self.source_starts = array("q", source_starts or [])
+        self.source_ends = array("q", source_ends or [])
+
+    @classmethod
+    def from_lemma_tokens(cls, lemma_tokens):
+        '''
+        Builds the lemmatized text and its alignment from (lemma, start, end) tokens in text order
+        The text is the lemmas joined by single spaces, the same as SpacyLemmatizer._lemmas_from_doc
+        '''
+        alignment = cls()
+        lemmas = []
+        position = 0
+        for lemma, start, end in lemma_tokens:
+            if lemmas:
+                position += 1  # the joining space
+            lemmas.append(lemma)
+            alignment.lemma_starts.append(position)
+            position += len(lemma)
+            alignment.lemma_ends.append(position)
+            alignment.source_starts.append(start)
+            alignment.source_ends.append(end)
+        return " ".join(lemmas), alignment
+
+    def project(self, start, end):
+        '''
+        (lemma_start, lemma_end) covering every lemma token that overlaps the source range, None if no token does
+        '''
+        # source tokens are in order and don't overlap, so both columns are sorted
+        first = bisect_right(self.source_ends, start)
+        last = bisect_left(self.source_starts, end)
+        if first >= last:
+            return None
+        return self.lemma_starts[first], self.lemma_ends[last - 1]
+
+    def to_list(self):
+        ''' Flat [lemma_start, lemma_end, source_start, source_end, ...], for JSON caching '''
+        flat = []
+        for row in zip(self.lemma_starts, self.lemma_ends, self.source_starts, self.source_ends):
+            flat.extend(row)
+        return flat
+
+    @classmethod
+    def from_list(cls, flat):
+        return cls(flat[0::4], flat[1::4], flat[2::4], flat[3::4])
+
+    def __len__(self):
+        return len(self.lemma_starts)
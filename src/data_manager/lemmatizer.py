@@ -1,5 +1,9 @@
 # Multi-language lemmatization using spaCy
 import re
+import os
+import json
+import time
+from collections import OrderedDict
 from typing import Optional, Dict, List, Union
 
 import spacy
@@ -11,8 +15,12 @@ from spacy.lang.es import Spanish
 from spacy.lang.fr import French
 from lingua import Language
 
+from .lemma_alignment import LemmaAlignment
+
 class SpacyLemmatizer:
-    models = {}  # Cache for loaded models
+    models = {}  # Cache for loaded full models
+    variant_models = {}  # Cache for task specific variants, keyed by (language key, variant)
+    load_stats = {}  # (language key, variant) -> load seconds and resident memory delta
     model_names = {
         'ENGLISH': 'en_core_web_lg',
         'CHINESE': 'zh_core_web_lg', 
@@ -22,6 +30,22 @@ class SpacyLemmatizer:
         'FRENCH': 'fr_core_news_lg'
     }
     
+    # Bounded LRU cache of entity lemmas keyed by (language key, model key, surface form)
+    # the model key (name==version/variant) keeps lemmas from another model or variant from being served
+    lemma_cache = OrderedDict()
+    lemma_cache_variant = 'lemmatizer'
+    lemma_model_keys = {}  # language key -> model key, the installed model doesn't change within a process
+    lemma_cache_size = 100000
+
+    # Components excluded per task variant, excluded components are never loaded so cost no time or memory
+    # tokenizer: CJK matching and token walks, lemmatizer: tagger/attribute ruler/lemmatizer only, full: everything
+    model_variants = {
+        'tokenizer': ['tok2vec', 'transformer', 'tagger', 'morphologizer', 'parser', 'senter',
+                      'attribute_ruler', 'lemmatizer', 'trainable_lemmatizer', 'ner'],
+        'lemmatizer': ['parser', 'senter', 'ner'],
+        'full': [],
+    }
+    
     # Map lingua Language enum to our language keys
     lingua_to_key = {
         Language.ENGLISH: 'ENGLISH',
@@ -34,19 +58,94 @@ class SpacyLemmatizer:
     
     @classmethod
     def _load_model(cls, language_key: str):
-        """Lazy load spaCy model only when needed"""
-        if language_key not in cls.models:
+        """Lazy load the full spaCy model only when needed"""
+        return cls.get_model(language_key, 'full')
+
+    @classmethod
+    def get_model(cls, language: Union[str, Language], variant: str = 'full'):
+        """
+        Lazy load a task specific variant of a language's model, each variant is loaded once.
+        Reports load time and resident memory growth per variant.
+        """
+        language_key = cls._to_language_key(language)
+        if variant not in cls.model_variants:
+            raise ValueError(f"Unknown model variant: {variant}")
+        cache_key = (language_key, variant)
+        if cache_key not in cls.variant_models:
             model_name = cls.model_names.get(language_key)
             if not model_name:
                 raise ValueError(f"No model name defined for language: {language_key}")
             
-            try:
-                cls.models[language_key] = spacy.load(model_name)
-                print(f"Loaded spaCy model: {model_name}")
-            except OSError:
-                raise OSError(f"spaCy model '{model_name}' not found. Install with: python -m spacy download {model_name}")
+            rss_before = cls._current_rss_mb()
+            start_time = time.perf_counter()
+            # exclude doesn't drop the vocab or vectors, so variants of a language share the first one's Vocab
+            loaded = next((model for (key, _), model in cls.variant_models.items() if key == language_key), None)
+            if variant == 'tokenizer' and loaded is not None:
+                # nothing to load, a blank pipeline around the loaded tokenizer and vocab
+                nlp = spacy.blank(loaded.lang, vocab=loaded.vocab)
+                nlp.tokenizer = loaded.tokenizer
+            else:
+                try:
+                    nlp = spacy.load(model_name, exclude=cls.model_variants[variant],
+                                     vocab=loaded.vocab if loaded is not None else True)
+                except OSError:
+                    raise OSError(f"spaCy model '{model_name}' not found. Install with: python -m spacy download {model_name}")
+            load_seconds = time.perf_counter() - start_time
+            rss_delta = cls._current_rss_mb() - rss_before
+
+            cls.variant_models[cache_key] = nlp
+            if variant == 'full':
+                cls.models[language_key] = nlp
+            cls.load_stats[cache_key] = {"load_seconds": load_seconds, "rss_delta_mb": rss_delta, "pipes": list(nlp.pipe_names)}
+            print(f"Loaded spaCy model: {model_name} ({variant}) in {load_seconds:.2f}s, +{rss_delta:.0f}MB RSS, pipes {nlp.pipe_names}")
         
-        return cls.models[language_key]
+        return cls.variant_models[cache_key]
+
+    @classmethod
+    def warm_up(cls, language: Union[str, Language], variants=('lemmatizer',)):
+        """
+        Loads variants ahead of time and runs a short text through each, so the first real call
+        doesn't pay for lazy initialisation. Returns the load stats of the variants.
+        """
+        language_key = cls._to_language_key(language)
+        for variant in variants:
+            nlp = cls.get_model(language_key, variant)
+            nlp("warm up")
+        return {variant: cls.load_stats[(language_key, variant)] for variant in variants}
+
+    @staticmethod
+    def _current_rss_mb():
+        # /proc gives the current resident set on linux, elsewhere fall back to the peak
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, AttributeError):
+            import resource
+            import sys
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is bytes on macOS, kilobytes on linux
+            return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    @classmethod
+    def model_identity(cls, language: Union[str, Language]):
+        """Returns (model name, installed version) without loading the model, used for cache keys"""
+        language_key = cls._to_language_key(language)
+        model_name = cls.model_names.get(language_key)
+        if not model_name:
+            raise ValueError(f"No model name defined for language: {language_key}")
+        try:
+            from spacy.util import get_package_version
+            model_version = get_package_version(model_name) or "unknown"
+        except ImportError:
+            model_version = "unknown"
+        return model_name, model_version
+
+    @staticmethod
+    def _to_language_key(language: Union[str, Language]):
+        # Convert lingua Language enum to string key if needed
+        if isinstance(language, Language):
+            return SpacyLemmatizer.lingua_to_key.get(language, 'ENGLISH')
+        return language
     
     @staticmethod
     def lemmatize_text(text: str, language: Union[str, Language]):
@@ -55,35 +154,179 @@ class SpacyLemmatizer:
             print("lemmatiser was called without text, likely error")
             return text
         
-        # Convert lingua Language enum to string key if needed
-        if isinstance(language, Language):
-            language_key = SpacyLemmatizer.lingua_to_key.get(language, 'ENGLISH')
-        else:
-            language_key = language
+        language_key = SpacyLemmatizer._to_language_key(language)
 
         if language_key not in SpacyLemmatizer.model_names:
             raise ValueError(f"Language {language_key} not supported")
 
         # Load model only when needed
-        nlp = SpacyLemmatizer._load_model(language_key)
+        nlp = SpacyLemmatizer.get_model(language_key, 'lemmatizer')
     
         # Process the text with spaCy
         doc = nlp(text)
         
-        # Extract lemmatized tokens, preserving word boundaries
-        lemmatized_tokens = []
+        return SpacyLemmatizer._lemmas_from_doc(doc)
+
+    @staticmethod
+    def lemmatize_text_aligned(text: str, language: Union[str, Language]):
+        """(lemmatized text, LemmaAlignment) for a single text, the text matches lemmatize_text"""
+        if not text:
+            return text, LemmaAlignment()
+        language_key = SpacyLemmatizer._to_language_key(language)
+        if language_key not in SpacyLemmatizer.model_names:
+            raise ValueError(f"Language {language_key} not supported")
+        _, lemma_tokens = SpacyLemmatizer.lemmatize_doc(text, language_key)
+        return LemmaAlignment.from_lemma_tokens(lemma_tokens)
+
+    @staticmethod
+    def lemmatize_doc(text: str, language: Union[str, Language]):
+        """
+        Parses text once and returns the doc with its (lemma, start, end) tokens, offsets are into text
+        For callers which need both the lemmas and the token positions without running the model twice
+        """
+        nlp = SpacyLemmatizer.get_model(language, 'lemmatizer')
+        doc = nlp(text)
+        return doc, SpacyLemmatizer.lemma_tokens_from_doc(doc)
+
+    @staticmethod
+    def lemma_tokens_from_doc(doc):
+        """(lemma, start, end) for every non space, non punctuation token, the tokens _lemmas_from_doc joins"""
+        lemma_tokens = []
         for token in doc:
             if not token.is_space and not token.is_punct:
                 # Use lemma if available, otherwise use lowercase text
                 lemma = token.lemma_ if hasattr(token, 'lemma_') and token.lemma_ else token.text.lower()
-                lemmatized_tokens.append(lemma)
-        
-        return ' '.join(lemmatized_tokens)
+                lemma_tokens.append((lemma, token.idx, token.idx + len(token.text)))
+        return lemma_tokens
+
+    @staticmethod
+    def _lemmas_from_doc(doc):
+        # Extract lemmatized tokens, preserving word boundaries
+        return ' '.join(lemma for lemma, _, _ in SpacyLemmatizer.lemma_tokens_from_doc(doc))
+
+    @staticmethod
+    def lemmatize_texts(texts, language: Union[str, Language], batch_size: int = 16, n_process: int = 1, aligned: bool = False):
+        """
+        Lemmatizes many texts (e.g. every chapter) through nlp.pipe, yielding results in input order.
+        Uses the lemmatizer variant (no parser/NER) as lemmas don't depend on them, n_process > 1 spreads
+        batches over worker processes. Reports chapters per second once exhausted.
+        aligned yields (lemmatized text, LemmaAlignment) instead, mapping lemma tokens back to source characters.
+        """
+        language_key = SpacyLemmatizer._to_language_key(language)
+
+        if language_key not in SpacyLemmatizer.model_names:
+            raise ValueError(f"Language {language_key} not supported")
+
+        nlp = SpacyLemmatizer.get_model(language_key, 'lemmatizer')
+
+        start_time = time.perf_counter()
+        count = 0
+        for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+            count += 1
+            if aligned:
+                yield LemmaAlignment.from_lemma_tokens(SpacyLemmatizer.lemma_tokens_from_doc(doc))
+            else:
+                yield SpacyLemmatizer._lemmas_from_doc(doc)
+
+        elapsed = time.perf_counter() - start_time
+        if count:
+            rate = count / elapsed if elapsed else float('inf')
+            print(f"Lemmatized {count} texts in {elapsed:.2f}s ({rate:.2f} chapters/s, n_process={n_process}, batch_size={batch_size})")
     
     @staticmethod
     def lemmatize_entity(entity: str, language: Union[str, Language] = 'ENGLISH'):
-        """Lemmatize a single entity"""
-        return SpacyLemmatizer.lemmatize_text(entity, language)
+        """Lemmatize a single entity, served from the lemma cache when seen before"""
+        return SpacyLemmatizer.lemmatize_entities([entity], language)[0]
+
+    @staticmethod
+    def lemmatize_entities(entities: List[str], language: Union[str, Language] = 'ENGLISH', batch_size: int = 256):
+        """
+        Lemmatize many entities (e.g. glossary terms) at once, results are in input order.
+        Cached lemmas are reused, the remaining unique surface forms go through one nlp.pipe run.
+        """
+        language_key = SpacyLemmatizer._to_language_key(language)
+        model_key = SpacyLemmatizer._lemma_model_key(language_key)
+        cache = SpacyLemmatizer.lemma_cache
+
+        results = [None] * len(entities)
+        uncached = {}
+        for i, entity in enumerate(entities):
+            if not entity:
+                results[i] = entity
+                continue
+            key = (language_key, model_key, entity)
+            if key in cache:
+                cache.move_to_end(key)
+                results[i] = cache[key]
+            else:
+                uncached.setdefault(entity, []).append(i)
+
+        if uncached:
+            if language_key not in SpacyLemmatizer.model_names:
+                raise ValueError(f"Language {language_key} not supported")
+            nlp = SpacyLemmatizer.get_model(language_key, SpacyLemmatizer.lemma_cache_variant)
+            surfaces = list(uncached)
+            for surface, doc in zip(surfaces, nlp.pipe(surfaces, batch_size=batch_size)):
+                lemma = SpacyLemmatizer._lemmas_from_doc(doc)
+                SpacyLemmatizer._cache_lemma(language_key, model_key, surface, lemma)
+                for i in uncached[surface]:
+                    results[i] = lemma
+
+        return results
+
+    @staticmethod
+    def _lemma_model_key(language_key: str):
+        """name==version/variant of the model entity lemmas come from, None for unsupported languages"""
+        if language_key not in SpacyLemmatizer.model_names:
+            return None
+        if language_key not in SpacyLemmatizer.lemma_model_keys:
+            model_name, model_version = SpacyLemmatizer.model_identity(language_key)
+            SpacyLemmatizer.lemma_model_keys[language_key] = f"{model_name}=={model_version}/{SpacyLemmatizer.lemma_cache_variant}"
+        return SpacyLemmatizer.lemma_model_keys[language_key]
+
+    @staticmethod
+    def _cache_lemma(language_key: str, model_key: str, surface: str, lemma: str):
+        cache = SpacyLemmatizer.lemma_cache
+        cache[(language_key, model_key, surface)] = lemma
+        cache.move_to_end((language_key, model_key, surface))
+        while len(cache) > SpacyLemmatizer.lemma_cache_size:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def save_lemma_cache(path: str):
+        """Persist the lemma cache, least recently used first so reloading keeps the LRU order"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        entries = [[language_key, model_key, surface, lemma]
+                   for (language_key, model_key, surface), lemma in SpacyLemmatizer.lemma_cache.items()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+    @staticmethod
+    def load_lemma_cache(path: str):
+        """
+        Load a cache saved by save_lemma_cache, returns how many entries were loaded
+        Entries made by another model, version or variant than the installed one are discarded
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        current_keys = {}
+        loaded = 0
+        for entry in entries:
+            # files from before the model key was stored have three fields, none of them can be trusted
+            if len(entry) != 4:
+                continue
+            language_key, model_key, surface, lemma = entry
+            if language_key not in current_keys:
+                current_keys[language_key] = SpacyLemmatizer._lemma_model_key(language_key)
+            if model_key != current_keys[language_key]:
+                continue
+            SpacyLemmatizer._cache_lemma(language_key, model_key, surface, lemma)
+            loaded += 1
+        if loaded < len(entries):
+            print(f"Discarded {len(entries) - loaded} cached lemmas from a different spaCy model")
+        return loaded
     
     @staticmethod
     def find_entity_matches(text: str, entity: str, language: Union[str, Language]):
@@ -103,10 +346,11 @@ class SpacyLemmatizer:
             cjk_keys = ['CHINESE', 'JAPANESE', 'KOREAN']
             is_cjk = language_key in cjk_keys
 
-        spacy_model = SpacyLemmatizer._load_model(language_key)
         matches = []
 
         if is_cjk:
+            # CJK only needs word segmentation, the tokenizer variant skips every pipeline component
+            spacy_model = SpacyLemmatizer.get_model(language_key, 'tokenizer')
             # Use spaCy tokenization for CJK languages
             doc = spacy_model(text)
             for token in doc:
@@ -0,0 +1,78 @@
+PARAGRAPH_SEPARATOR = "\n\n"
+
+class TextSpan():
+    '''
+    A character range (chapter_idx, start, end) of a chapter, offsets are chapter absolute
+    Holds a reference to the text it came from instead of a copy, the text is only sliced out when asked for
+    source may be the whole chapter or a window of it beginning at source_offset (e.g. a RAG node)
+    '''
+    __slots__ = ("chapter_idx", "start", "end", "source", "source_offset")
+
+    def __init__(self, chapter_idx, start, end, source, source_offset=0):
+        self.chapter_idx = chapter_idx
+        self.start = start
+        self.end = end
+        self.source = source
+        self.source_offset = source_offset
+
+    @property
+    def text(self):
+        return self.source[self.start - self.source_offset:self.end - self.source_offset]
+
+    def sub_span(self, start, end):
+        '''
+        Span of a range relative to this span's text, e.g. an entity hit inside a paragraph
+        '''
+        return TextSpan(self.chapter_idx, self.start + start, self.start + end, self.source, self.source_offset)
+
+    def to_tuple(self):
+        return (self.chapter_idx, self.start, self.end)
+
+    @staticmethod
+    def split(chapter_idx, text, separator=PARAGRAPH_SEPARATOR):
+        '''
+        Same pieces as text.split(separator) but as spans pointing into text
+        '''
+        spans = []
+        start = 0
+        while True:
+            end = text.find(separator, start)
+            if end == -1:
+                spans.append(TextSpan(chapter_idx, start, len(text), text))
+                return spans
+            spans.append(TextSpan(chapter_idx, start, end, text))
+            start = end + len(separator)
+
+    @staticmethod
+    def from_segments(chapter_idx, segments, separator=PARAGRAPH_SEPARATOR):
+        '''
+        Wraps plain string segments as spans, assuming they were split from the chapter on separator
+        Segments which are already spans are kept as they are
+        '''
+        spans = []
+        position = 0
+        for segment in segments:
+            if isinstance(segment, TextSpan):
+                spans.append(segment)
+                position = segment.end + len(separator)
+                continue
+            spans.append(TextSpan(chapter_idx, position, position + len(segment), segment, source_offset=position))
+            position += len(segment) + len(separator)
+        return spans
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __eq__(self, other):
+        if isinstance(other, TextSpan):
+            return self.to_tuple() == other.to_tuple()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.to_tuple())
+
+    def __repr__(self):
+        return f"TextSpan(chapter_idx={self.chapter_idx}, start={self.start}, end={self.end})"
@@ -0,0 +1,101 @@
+from typing import NamedTuple
+
+from ..data_manager.lemmatizer import SpacyLemmatizer
+from .glossary_automaton import GlossaryAutomaton
+from .lemma_trie import LemmaTrie
+from .annotation_store import render_inline
+
+class Annotation(NamedTuple):
+    ''' A glossary hit, offsets are into the original untagged segment '''
+    start: int
+    end: int
+    entity: str
+    translation: str
+    glossary_id: int
+    kind: str  # "exact" or "lemma"
+
+class AnnotationEngine():
+    '''
+    Collects every exact and lemma glossary hit against the original segment text,
+    resolves overlaps once and renders the tagged segment in a single pass
+    Replaces tagging by repeated string slicing, nothing is re-scanned or stripped back out
+    '''
+    # exact hits win over lemma hits, then longest, then earliest
+    kind_priority = {"exact": 0, "lemma": 1}
+
+    def __init__(self, glossary, language):
+        self.language = language
+
+        # CJK has no word boundaries to anchor on, hits are instead checked against spaCy token edges
+        self.is_cjk = SpacyLemmatizer._to_language_key(language) in ('CHINESE', 'JAPANESE', 'KOREAN')
+        self.automaton = GlossaryAutomaton(
+            ((entry["entity"], (glossary_id, entry["entity"], entry["english target translation"]))
+             for glossary_id, entry in enumerate(glossary)),
+            case_insensitive=True,
+            word_boundaries=not self.is_cjk
+        )
+
+        # lemma token sequences -> (entity, translation), first glossary entry wins like the old per entity loop
+        self.lemma_trie = LemmaTrie(
+            (entry.get("lemmatized entity"), (glossary_id, entry["entity"], entry["english target translation"]))
+            for glossary_id, entry in enumerate(glossary)
+        )
+
+    def annotate(self, text):
+        '''
+        Returns the rendered segment and the resolved annotations it was rendered from
+        '''
+        annotations = self.resolve(self.collect(text))
+        return self.render(text, annotations), annotations
+
+    def collect(self, text):
+        annotations = self._exact_annotations(text)
+        try:
+            annotations.extend(self._lemma_annotations(text))
+        except Exception as e:
+            print(f"Full-context lemmatization failed for segment: {e}")
+        return annotations
+
+    def _exact_annotations(self, text):
+        hits = self.automaton.find_all(text)
+        if self.is_cjk and hits:
+            nlp = SpacyLemmatizer.get_model(self.language, 'tokenizer')
+            token_starts, token_ends = set(), set()
+            for token in nlp(text):
+                token_starts.add(token.idx)
+                token_ends.add(token.idx + len(token.text))
+            hits = [hit for hit in hits if hit[0] in token_starts and hit[1] in token_ends]
+        return [Annotation(start, end, entity, translation, glossary_id, "exact")
+                for start, end, (glossary_id, entity, translation) in hits]
+
+    def _lemma_annotations(self, text):
+        # no language, no spaCy model to lemmatize with
+        if self.language is None or not len(self.lemma_trie) or not text:
+            return []
+        # one parse gives both the lemmas and where each came from in the segment
+        _, lemma_tokens = SpacyLemmatizer.lemmatize_doc(text, self.language)
+        return [Annotation(start, end, entity, translation, glossary_id, "lemma")
+                for start, end, (glossary_id, entity, translation) in self.lemma_trie.find_all(lemma_tokens)]
+
+    @classmethod
+    def resolve(cls, annotations):
+        '''
+        Drops overlapping annotations in one pass, returned in text order
+        '''
+        accepted = []
+        taken = set()
+        ordered = sorted(annotations, key=lambda a: (cls.kind_priority[a.kind], a.start - a.end, a.start))
+        for annotation in ordered:
+            if any(position in taken for position in range(annotation.start, annotation.end)):
+                continue
+            taken.update(range(annotation.start, annotation.end))
+            accepted.append(annotation)
+        accepted.sort(key=lambda a: a.start)
+        return accepted
+
+    @staticmethod
+    def render(text, annotations):
+        '''
+        Builds the tagged segment left to right in one pass, annotations must not overlap
+        '''
+        return render_inline(text, [(a.start, a.end, a.entity, a.translation) for a in annotations])
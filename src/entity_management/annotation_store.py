@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import zipfile
+from array import array
+
+def render_inline(text, spans):
+    '''
+    Builds the "[entity translates to translation]" tagged text left to right in one pass
+    spans are non overlapping (start, end, entity, translation) in text order
+    '''
+    pieces = []
+    position = 0
+    for start, end, entity, translation in spans:
+        pieces.append(text[position:start])
+        pieces.append(f"{text[start:end]} [{entity} translates to {translation}]")
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+class AnnotationStore():
+    '''
+    Glossary hits kept apart from the text, per segment lists of (start, end, glossary_id) spans
+    Spans are held as flat columns (chapter, segment, start, end, glossary_id) in stdlib arrays,
+    saved as one zip holding each column's raw bytes plus a JSON header with the glossary terms
+    Consumers can render tagged prompts or re-annotate from this without parsing the inline markers back out
+    '''
+    HEADER_FILE = "header.json"
+    COLUMNS = ("chapter", "segment", "start", "end", "glossary_id")
+    TYPECODE = "q"
+
+    def __init__(self, glossary_terms=None):
+        '''
+        glossary_terms is a list of (entity, translation), glossary_id indexes into it
+        '''
+        self.glossary_terms = [tuple(term) for term in glossary_terms or []]
+        self.columns = {name: array(self.TYPECODE) for name in self.COLUMNS}
+        # (chapter, segment) -> (first row, row count)
+        self.segments = {}
+
+    @classmethod
+    def from_glossary(cls, glossary):
+        return cls([(entry["entity"], entry["english target translation"]) for entry in glossary])
+
+    def add_segment(self, chapter_idx, segment_idx, spans):
+        '''
+        Records the spans of one segment, spans are (start, end, glossary_id) in text order
+        '''
+        first = len(self.columns["start"])
+        for start, end, glossary_id in spans:
+            self.columns["chapter"].append(chapter_idx)
+            self.columns["segment"].append(segment_idx)
+            self.columns["start"].append(start)
+            self.columns["end"].append(end)
+            self.columns["glossary_id"].append(glossary_id)
+        self.segments[(chapter_idx, segment_idx)] = (first, len(self.columns["start"]) - first)
+
+    def segment_spans(self, chapter_idx, segment_idx):
+        first, count = self.segments.get((chapter_idx, segment_idx), (0, 0))
+        starts, ends, glossary_ids = self.columns["start"], self.columns["end"], self.columns["glossary_id"]
+        return [(starts[row], ends[row], glossary_ids[row]) for row in range(first, first + count)]
+
+    def chapter_spans(self, chapter_idx):
+        '''
+        segment_idx -> spans for one chapter, segments without hits are included with an empty list
+        '''
+        return {segment_idx: self.segment_spans(chapter, segment_idx)
+                for chapter, segment_idx in sorted(self.segments) if chapter == chapter_idx}
+
+    def render(self, chapter_idx, segment_idx, text):
+        '''
+        The segment with inline "[entity translates to translation]" markers, same output as inline matching
+        '''
+        spans = [(start, end) + self.glossary_terms[glossary_id]
+                 for start, end, glossary_id in self.segment_spans(chapter_idx, segment_idx)]
+        return render_inline(text, spans)
+
+    def render_chapters(self, chapter_keyed_list):
+        '''
+        Renders a whole chapter keyed list of untouched segments
+        '''
+        return {chapter_idx: [self.render(chapter_idx, segment_idx, str(segment)) for segment_idx, segment in enumerate(segments)]
+                for chapter_idx, segments in chapter_keyed_list.items()}
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = {
+            "typecode": self.TYPECODE,
+            "itemsize": array(self.TYPECODE).itemsize,
+            "byteorder": sys.byteorder,
+            "rows": len(self.columns["start"]),
+            "columns": list(self.COLUMNS),
+            "segments": [[chapter_idx, segment_idx, first, count]
+                         for (chapter_idx, segment_idx), (first, count) in self.segments.items()],
+            "glossary": [list(term) for term in self.glossary_terms]
+        }
+        temp_path = path + ".tmp"
+        with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(self.HEADER_FILE, json.dumps(header, ensure_ascii=False))
+            for name in self.COLUMNS:
+                archive.writestr(f"{name}.bin", self.columns[name].tobytes())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with zipfile.ZipFile(path, "r") as archive:
+            header = json.loads(archive.read(cls.HEADER_FILE).decode("utf-8"))
+            store = cls(header["glossary"])
+            for name in header["columns"]:
+                column = array(header["typecode"])
+                column.frombytes(archive.read(f"{name}.bin"))
+                if header["byteorder"] != sys.byteorder:
+                    column.byteswap()
+                store.columns[name] = column
+        store.segments = {(chapter_idx, segment_idx): (first, count)
+                          for chapter_idx, segment_idx, first, count in header["segments"]}
+        return store
+
+    def __len__(self):
+        return len(self.columns["start"])
@@ -1,6 +1,10 @@
-from find_entities import OccurrenceFinder
-from title_pronoun_filter import NERFilter
+import os
+import json
+
+from .find_entities import OccurrenceFinder
+from .title_pronoun_filter import NERFilter
 from .entity_types.entity import Entity
+from .entity_types.occurrence import Occurrence
 # option to use LingMess for more accuracy, from fastcoref
 
 class EntityManager():
@@ -9,47 +13,167 @@ class EntityManager():
     Should support loading from json and dynamically updating entities as new chapters are processed
     Entity is an object of a class, contains occurrences of the entity
     '''
-    def __init__(self, chapter_dic, lemmatized_chapter_dic, language, use_extra_gemini_ner, extensive_filter = False):
+    # chapters whose chunks go through one batched NER run, bounds memory when streaming
+    ner_batch_chapters = 32
+
+    def __init__(self, chapter_dic, lemmatized_chapter_dic, language, use_extra_gemini_ner, extensive_filter = False, ner_batch_size = None,
+                 lemma_alignment_dic = None, ner_cascade = None):
         self.occurrence_finder = OccurrenceFinder()
+        self.language = language
+        self.use_extra_gemini_ner = use_extra_gemini_ner
+        self.extensive_filter = extensive_filter
+        self.ner_batch_size = ner_batch_size
+        # NERCascade, escalates paragraphs the local model is unsure about to Gemini when use_extra_gemini_ner is set
+        self.ner_cascade = ner_cascade if use_extra_gemini_ner else None
 
-        # Find entities through running NER over base and lemmatised 
-        base_entities_dic = self._find_entities(text_dic=chapter_dic)
-        lemmatized_entities_dic = self._find_entities(text_dic=lemmatized_chapter_dic)
+        self.base_entities_dic = {}
+        self.lemmatized_entities_dic = {}
+        self.largest_idx = None
+        self.touched_entities = set()  # names whose occurrences changed since construction/load, for glossary refresh
 
-        # Renove pronouns and titles which are mistakes
-        base_entities_dic = self._remove_pronouns_titles(base_entities_dic, language, extensive_filter)
-        lemmatized_entities_dic = self._remove_pronouns_titles(lemmatized_entities_dic, language, extensive_filter)
+        # Find entities through running NER over base, projected onto lemmatised where there's an alignment
+        lemma_alignment_dic = lemma_alignment_dic or {}
+        if chapter_dic:
+            self.add_chapters({chapter_idx: (chapter_dic[chapter_idx], lemmatized_chapter_dic[chapter_idx], lemma_alignment_dic.get(chapter_idx))
+                               for chapter_idx in chapter_dic})
+        self.update_cutoffs()
 
         # Coreference resolution steps
 
         # entity unifier
 
+    @classmethod
+    def from_chapter_records(cls, chapter_records, language, use_extra_gemini_ner, extensive_filter = False, ner_batch_size = None,
+                             ner_cascade = None):
+        '''
+        Builds entities from an iterable of ChapterRecords a batch of chapters at a time, used in streaming mode
+        '''
+        entity_manager = cls({}, {}, language, use_extra_gemini_ner, extensive_filter, ner_batch_size, ner_cascade=ner_cascade)
+        entity_manager.add_chapter_records(chapter_records)
+        entity_manager.update_cutoffs()
+        return entity_manager
+
+    @classmethod
+    def load(cls, path, language, use_extra_gemini_ner, extensive_filter = False, ner_batch_size = None, ner_cascade = None):
+        '''
+        Restores entities saved by save, new chapters can then be merged in with add_chapter
+        '''
+        entity_manager = cls({}, {}, language, use_extra_gemini_ner, extensive_filter, ner_batch_size, ner_cascade=ner_cascade)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        entity_manager.base_entities_dic = {item["name"]: Entity.from_dict(item) for item in data["base_entities"]}
+        entity_manager.lemmatized_entities_dic = {item["name"]: Entity.from_dict(item) for item in data["lemmatized_entities"]}
+        entity_manager.largest_idx = data.get("largest_idx")
+        return entity_manager
 
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = {
+            "largest_idx": self.largest_idx,
+            "base_entities": [entity.to_dict() for entity in self.base_entities_dic.values()],
+            "lemmatized_entities": [entity.to_dict() for entity in self.lemmatized_entities_dic.values()]
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def remove_chapters(self, chapter_indices):
+        '''
+        Forgets occurrences from the given chapters, entities left without any occurrence are dropped
+        Done before re-adding edited chapters so their old occurrences aren't double counted
+        '''
+        for entity_dic in (self.base_entities_dic, self.lemmatized_entities_dic):
+            for name in list(entity_dic):
+                entity = entity_dic[name]
+                if any(chapter_idx in entity.occurrences_by_chapter for chapter_idx in chapter_indices):
+                    self.touched_entities.add(name)
+                    for chapter_idx in chapter_indices:
+                        entity.remove_chapter(chapter_idx)
+                    if not entity.occurrences_by_chapter:
+                        del entity_dic[name]
+
+    def add_chapter(self, chapter_idx, text, lemmatized_text, lemma_alignment=None):
+        '''
+        Runs NER over a single chapter and merges its occurrences into the existing entities
+        '''
+        self.add_chapters({chapter_idx: (text, lemmatized_text, lemma_alignment)})
 
-    def _find_entities(self, text_dic):
-        '''
-        Finds occurrences and turns them into a hashmap of entity objects keyed by name
-        '''
-        entity_dic = {}
-        largest_idx = 0
-        for chapter_idx in text_dic:
-            text = text_dic[chapter_idx]
-            occurrences = self.occurrence_finder.find_occurrence(text)
-            for occurrence in occurrences:
-                if occurrence not in entity_dic:
-                    # newly found occurrence is an entity
-                    entity_dic[occurrence] = Entity(entity_dic[occurrence], chapter_idx)
-                else:
-                    entity_dic[occurrence].add_occurrence(chapter_idx)
-            if chapter_idx > largest_idx:
-                largest_idx = chapter_idx
-        for value in entity_dic.values():
-            value.update_cutoff(chapter_idx)
-        return entity_dic
-    
-    def _remove_pronouns_titles(self, entity_dic, language, extensive_filter):
-        return {entity: entity_dic[entity] 
-                for entity 
-                in entity_dic 
-                if NERFilter.isRemovable(entity, language, extensive_filter)}
-    
+    def add_chapters(self, chapters):
+        '''
+        Runs batched NER over many chapters, chapters maps chapter_idx -> (text, lemmatized_text[, lemma_alignment])
+        NER only runs over the base text, its hits are projected onto the lemmatized text through the alignment
+        Chapters without an alignment (e.g. lemmatizer unavailable) fall back to NER over the lemmatized text
+        With a ner_cascade, Gemini hits from escalated paragraphs are added to the base occurrences before projection
+        '''
+        chapters = {chapter_idx: (value + (None,))[:3] for chapter_idx, value in chapters.items()}
+        chapter_texts = {chapter_idx: text for chapter_idx, (text, _, _) in chapters.items()}
+        base_occurrences = self.occurrence_finder.find_occurrences_batch(chapter_texts, self.ner_batch_size)
+        if self.ner_cascade is not None:
+            extra_occurrences = self.ner_cascade.find_extra_entities(chapter_texts, base_occurrences, self.base_entities_dic.keys())
+            for chapter_idx, extra in extra_occurrences.items():
+                base_occurrences[chapter_idx] = sorted(base_occurrences[chapter_idx] + extra, key=lambda occurrence: occurrence.start)
+        lemmatized_occurrences = {
+            chapter_idx: self._project_occurrences(base_occurrences[chapter_idx], lemmatized_text, alignment)
+            for chapter_idx, (_, lemmatized_text, alignment) in chapters.items() if alignment is not None
+        }
+        unaligned = {chapter_idx: lemmatized_text for chapter_idx, (_, lemmatized_text, alignment) in chapters.items() if alignment is None}
+        if unaligned:
+            lemmatized_occurrences.update(self.occurrence_finder.find_occurrences_batch(unaligned, self.ner_batch_size))
+        for chapter_idx in chapters:
+            self._merge_occurrences(self.base_entities_dic, chapter_idx, base_occurrences[chapter_idx])
+            self._merge_occurrences(self.lemmatized_entities_dic, chapter_idx, lemmatized_occurrences[chapter_idx])
+            if self.largest_idx is None or chapter_idx > self.largest_idx:
+                self.largest_idx = chapter_idx
+
+    def add_chapter_records(self, chapter_records):
+        '''
+        add_chapters over an iterable of ChapterRecords, ner_batch_chapters records are held at a time
+        '''
+        batch = {}
+        for record in chapter_records:
+            batch[record.chapter_idx] = (record.text, record.lemmatized_text, record.lemma_alignment)
+            if len(batch) >= self.ner_batch_chapters:
+                self.add_chapters(batch)
+                batch = {}
+        if batch:
+            self.add_chapters(batch)
+
+    def update_cutoffs(self):
+        if self.largest_idx is None:
+            return
+        for entity_dic in (self.base_entities_dic, self.lemmatized_entities_dic):
+            for value in entity_dic.values():
+                value.update_cutoff(self.largest_idx)
+
+    @staticmethod
+    def _project_occurrences(occurrences, lemmatized_text, alignment):
+        '''
+        Base text occurrences moved onto the lemmatized text, the surface becomes the lemmas of the covered tokens
+        '''
+        projected = []
+        for occurrence in occurrences:
+            span = alignment.project(occurrence.start, occurrence.end)
+            if span is None:
+                continue
+            lemma_start, lemma_end = span
+            projected.append(Occurrence(lemmatized_text[lemma_start:lemma_end], occurrence.label, lemma_start, lemma_end, occurrence.score))
+        return projected
+
+    def _merge_occurrences(self, entity_dic, chapter_idx, occurrences):
+        '''
+        occurrences are positional Occurrences, each counts once and its location goes in the entity's index
+        Plain entity strings (find_occurrence) are still accepted, those carry no position
+        '''
+        removable = {}
+        for occurrence in occurrences:
+            name, position = (occurrence.surface, occurrence) if isinstance(occurrence, Occurrence) else (occurrence, None)
+            # Renove pronouns and titles which are mistakes
+            if name not in removable:
+                removable[name] = NERFilter.isRemovable(name, self.language, self.extensive_filter)
+            if removable[name]:
+                continue
+            if name not in entity_dic:
+                # newly found occurrence is an entity
+                entity_dic[name] = Entity(name, chapter_idx, position)
+            else:
+                entity_dic[name].add_occurrence(chapter_idx, position)
+            self.touched_entities.add(name)
@@ -1,143 +1,115 @@
-
-import os
-import re
-from lingua import Language, LanguageDetectorBuilder
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 from ..data_manager.lemmatizer import SpacyLemmatizer
+from ..data_manager.text_span import TextSpan
+from ..utils.language_detector import LanguageDetector
+from .annotation_engine import AnnotationEngine
+from .annotation_store import AnnotationStore
+
+# per worker process engine, built once by _init_worker so the glossary index and spaCy model aren't reloaded per shard
+_worker_engine = None
+
+def _init_worker(glossary, language):
+    global _worker_engine
+    _worker_engine = AnnotationEngine(glossary, language)
+    # nothing to warm up when the language wasn't detected, the engine then skips lemma matching
+    if language is not None:
+        SpacyLemmatizer.warm_up(language, ('lemmatizer',))
+
+def _annotate_texts(engine, texts, inline):
+    '''
+    (rendered text or None, resolved annotations) for each segment text
+    '''
+    results = []
+    for text in texts:
+        annotations = engine.resolve(engine.collect(text))
+        results.append((engine.render(text, annotations) if inline else None, annotations))
+    return results
+
+def _annotate_shard(shard, inline):
+    # shard is a list of (chapter_idx, segment texts), only plain strings are sent to the worker
+    return [(chapter_idx, _annotate_texts(_worker_engine, texts, inline)) for chapter_idx, texts in shard]
 
 class Entity_Matcher:
-    def __init__(self, glossary, chapter_keyed_list):
+    def __init__(self, glossary, chapter_keyed_list, target_language=None):
         self.chapter_keyed_list = chapter_keyed_list
         self.glossary = glossary
-        languages = [Language.ENGLISH, Language.CHINESE, Language.JAPANESE, Language.KOREAN, Language.SPANISH, Language.FRENCH] 
-        # can add more later, what space has curently
-        detector = LanguageDetectorBuilder.from_languages(*languages).build()
-        rand_chap = ""
-        # will just take a random one to detect, this is single language documents so doesn't matter
-        for segment in next(iter(chapter_keyed_list.values())):
-            rand_chap += segment
-        self.target_language = detector.detect_language_of(rand_chap)
+        if target_language is None:
+            # single language documents, so a sample of a middle segment from a few chapters is enough
+            # segments may be TextSpans (stage 1, retrieve_chunks), the detector wants their text
+            sample_segments = [str(segments[len(segments) // 2]) for segments in chapter_keyed_list.values() if segments]
+            target_language, _ = LanguageDetector.detect_sampled(sample_segments)
+        self.target_language = target_language
+        # chapter_idx -> list of (TextSpan, entity), exact source offsets of every tagged hit
+        self.entity_hits = {}
+        self.engine = AnnotationEngine(glossary, self.target_language)
+        # structured (start, end, glossary_id) spans per segment, filled by get_matches
+        self.annotations = AnnotationStore.from_glossary(glossary)
     
-    def get_matches(self):
+    def get_matches(self, inline=True, workers=1):
+        '''
+        inline tags hits into the text as "[entity translates to translation]"
+        Otherwise the segments come back untouched and the hits are only kept in get_annotations()
+        workers above 1 shards the chapters across a process pool, results keep chapter order
+        Hits and annotations are rebuilt on every call rather than appended to
+        '''
+        self.entity_hits = {}
+        self.annotations = AnnotationStore.from_glossary(self.glossary)
         holder = self.chapter_keyed_list
-        holder = self._close_match(holder)
+        holder = self._close_match(holder, inline, workers)
         return holder
 
-    def _close_match(self, chapter_keyed_list):
-        entities = [(entry["entity"], entry["english target translation"]) for entry in self.glossary]
-        lemmatizer_map = {entry["entity"]: entry["lemmatized entity"] for entry in self.glossary}
+    def get_entity_hits(self):
+        return self.entity_hits
 
-        new_chapter_keyed_list = {}
+    def get_annotations(self):
+        return self.annotations
 
-        for chapter_idx, segments in chapter_keyed_list.items():
-            new_segments = []
+    def _close_match(self, chapter_keyed_list, inline=True, workers=1):
+        # segments may be plain strings, spans from stage 1/RAG or corpus store paragraphs
+        chapter_spans = {chapter_idx: TextSpan.from_segments(chapter_idx, segments)
+                         for chapter_idx, segments in chapter_keyed_list.items()}
 
-            for segment in segments:
-                result_text = segment
-                
-                # First, try exact matches with longer entities first to prevent double matching
-                # Sort entities by length (descending) to match longer phrases first
-                for entity, translation in sorted(entities, key=lambda x: -len(x[0])):
-                    # Use the new find_entity_matches function for better multilingual support
-                    matches = SpacyLemmatizer.find_entity_matches(result_text, entity, self.target_language)
-                    
-                    # Replace matches from right to left to preserve positions
-                    for start, end in reversed(matches):
-                        # Check if this position is already tagged
-                        before_match = result_text[:start]
-                        after_match = result_text[end:]
-                        
-                        # Skip if already tagged (check for translation markers nearby)
-                        if ('[' in after_match[:50] and 'translates to' in after_match[:100]) or \
-                           ('[' in before_match[-50:] and 'translates to' in before_match[-100:]):
-                            continue
-                        
-                        matched_text = result_text[start:end]
-                        replacement = f"{matched_text} [{entity} translates to {translation}]"
-                        result_text = result_text[:start] + replacement + result_text[end:]
-                
-                # Now do lemmatized matching for words that weren't already tagged
-                try:
-                    # Get clean text without translation tags for lemmatization
-                    clean_text = re.sub(r'\[[^\]]*translates to[^\]]*\]', '', result_text)
-                    
-                    # Lemmatize the entire clean text for better context
-                    lemmatized_clean_text = SpacyLemmatizer.lemmatize_text(clean_text, self.target_language)
-                    
-                    # Get spaCy model for token processing
-                    nlp = SpacyLemmatizer.models.get(SpacyLemmatizer.lingua_to_key.get(self.target_language, 'ENGLISH'))
-                    if nlp is None:
-                        raise ValueError(f"No model available for language {self.target_language}")
-                    
-                    # Process clean text and create lemma mapping
-                    doc = nlp(clean_text)
-                    lemmatized_tokens = lemmatized_clean_text.split()
-                    
-                    lemma_map = {}
-                    lemma_index = 0
-                    for token in doc:
-                        if not token.is_space and not token.is_punct and token.text.strip():
-                            if lemma_index < len(lemmatized_tokens):
-                                lemma_map[token.i] = {
-                                    'original': token.text,
-                                    'lemma': lemmatized_tokens[lemma_index],
-                                    'start': token.idx,
-                                    'end': token.idx + len(token.text)
-                                }
-                                lemma_index += 1
-                    
-                    # Apply lemmatized matching
-                    offset = 0  # Track offset due to inserted translation tags
-                    
-                    for i, token in enumerate(doc):
-                        if token.is_space or token.is_punct or not token.text.strip():
-                            continue
-                            
-                        # Check if this word is already tagged
-                        search_start = max(0, token.idx + offset - 50)
-                        search_end = min(len(result_text), token.idx + len(token.text) + offset + 50)
-                        search_area = result_text[search_start:search_end]
-                        
-                        # Skip if word is already tagged - more comprehensive check
-                        if re.search(r'\b' + re.escape(token.text) + r'\b\s*\[[^\]]*translates to[^\]]*\]', search_area, re.IGNORECASE):
-                            continue
-                        
-                        # Check lemmatized form for matches
-                        if i in lemma_map:
-                            lemma = lemma_map[i]['lemma']
-                            
-                            for entity, translation in entities:
-                                lemmatized_entity = lemmatizer_map.get(entity, "")
-                                if lemma == lemmatized_entity and lemmatized_entity:
-                                    # Use find_entity_matches for consistent matching
-                                    word_matches = SpacyLemmatizer.find_entity_matches(result_text, token.text, self.target_language)
-                                    
-                                    if word_matches:
-                                        # Take the first match that's not already tagged
-                                        for match_start, match_end in word_matches:
-                                            # Check more thoroughly if this position is already tagged
-                                            before_text = result_text[:match_start]
-                                            after_text = result_text[match_end:]
-                                            
-                                            # Skip if there's a translation marker nearby
-                                            if ('translates to' in after_text[:100]) or \
-                                               ('translates to' in before_text[-100:]):
-                                                continue
-                                                
-                                            print(f"matched lemmatized word '{token.text}' with entity '{entity}' as '{lemmatized_entity}'")
-                                            matched_text = result_text[match_start:match_end]
-                                            replacement = f"{matched_text} [{entity} translates to {translation}]"
-                                            result_text = result_text[:match_start] + replacement + result_text[match_end:]
-                                            offset += len(replacement) - len(matched_text)
-                                            break
-                                        break  # Only match one entity per word
-                    
-                except Exception as e:
-                    print(f"Full-context lemmatization failed for segment: {e}")
-                    pass
-                
-                new_segments.append(result_text)
+        if workers > 1 and len(chapter_spans) > 1:
+            chapter_results = self._annotate_parallel(chapter_spans, inline, workers)
+        else:
+            chapter_results = ((chapter_idx, _annotate_texts(self.engine, [span.text for span in spans], inline))
+                               for chapter_idx, spans in chapter_spans.items())
 
+        new_chapter_keyed_list = {}
+        for chapter_idx, results in chapter_results:
+            new_segments = []
+            for segment_idx, (segment_span, (rendered, annotations)) in enumerate(zip(chapter_spans[chapter_idx], results)):
+                # annotations were collected against the untagged text, so offsets are already source offsets
+                for annotation in annotations:
+                    self.entity_hits.setdefault(chapter_idx, []).append(
+                        (segment_span.sub_span(annotation.start, annotation.end), annotation.entity)
+                    )
+                self.annotations.add_segment(
+                    chapter_idx, segment_idx, [(a.start, a.end, a.glossary_id) for a in annotations]
+                )
+                new_segments.append(rendered if inline else segment_span.text)
             new_chapter_keyed_list[chapter_idx] = new_segments
 
-        return new_chapter_keyed_list
\ No newline at end of file
+        return new_chapter_keyed_list
+
+    def _annotate_parallel(self, chapter_spans, inline, workers):
+        '''
+        Annotates contiguous shards of chapters in a process pool, yields (chapter_idx, results) in chapter order
+        '''
+        chapters = [(chapter_idx, [span.text for span in spans]) for chapter_idx, spans in chapter_spans.items()]
+        # a few shards per worker so one long chapter run doesn't leave the others idle
+        shard_size = max(1, len(chapters) // (workers * 4))
+        shards = [chapters[i:i + shard_size] for i in range(0, len(chapters), shard_size)]
+
+        start_time = time.perf_counter()
+        # spawn, forking after torch/spaCy started their thread pools can deadlock the workers
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(self.glossary, self.target_language)) as executor:
+            # map keeps shard order, so chapters come back in the order they went in
+            for shard_results in executor.map(_annotate_shard, shards, [inline] * len(shards)):
+                yield from shard_results
+        print(f"Annotated {len(chapters)} chapters in {time.perf_counter() - start_time:.2f}s "
+              f"({workers} workers, {len(shards)} shards)")
@@ -1,20 +1,61 @@
 class Entity():
     ''' An individual entity, not unified with aliases '''
-    def __init__(self, name, chapter_idx):
+    def __init__(self, name, chapter_idx, occurrence=None):
         self.name = name
         self.occurrences_by_chapter = {}
-        self.add_occurrence(chapter_idx)
+        # chapter_idx -> [(start, end, label, score)], where in the chapter the entity was found
+        self.occurrence_index = {}
+        self.add_occurrence(chapter_idx, occurrence)
 
-    def add_occurrence(self, chapter_idx):
+    def add_occurrence(self, chapter_idx, occurrence=None):
+        '''
+        occurrence is the positional NER Occurrence, when given its location is kept in the occurrence index
+        '''
         self.chapter_idx_cutoff = chapter_idx
         if chapter_idx not in self.occurrences_by_chapter:
             self.occurrences_by_chapter[chapter_idx] = 1
         else:
             self.occurrences_by_chapter[chapter_idx] += 1
+        if occurrence is not None:
+            self.occurrence_index.setdefault(chapter_idx, []).append(
+                (occurrence.start, occurrence.end, occurrence.label, occurrence.score)
+            )
+
+    def get_positions(self, chapter_idx):
+        ''' (start, end) of each occurrence in a chapter, no need to search the text again '''
+        return [(start, end) for start, end, _, _ in self.occurrence_index.get(chapter_idx, [])]
+
+    def get_count(self, chapter_idx=None):
+        if chapter_idx is None:
+            return sum(self.occurrences_by_chapter.values())
+        return self.occurrences_by_chapter.get(chapter_idx, 0)
     
     def update_cutoff(self, chapter_idx):
         self.chapter_idx_cutoff = chapter_idx
 
+    def remove_chapter(self, chapter_idx):
+        ''' Drops a chapter's occurrences, used when an edited chapter is reprocessed '''
+        self.occurrences_by_chapter.pop(chapter_idx, None)
+        self.occurrence_index.pop(chapter_idx, None)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "occurrences_by_chapter": {str(key): value for key, value in self.occurrences_by_chapter.items()},
+            "occurrence_index": {str(key): [list(item) for item in value] for key, value in self.occurrence_index.items()},
+            "chapter_idx_cutoff": self.chapter_idx_cutoff
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        entity = cls.__new__(cls)
+        entity.name = data["name"]
+        entity.occurrences_by_chapter = {int(key): value for key, value in data["occurrences_by_chapter"].items()}
+        # saves from before positions were kept have no index
+        entity.occurrence_index = {int(key): [tuple(item) for item in value] for key, value in data.get("occurrence_index", {}).items()}
+        entity.chapter_idx_cutoff = data["chapter_idx_cutoff"]
+        return entity
+
     '''
     def load_save(self,name,lemmatized_name,chapter_cutoff,description,term_type,mention_chapter_idx,english_target_translation):
         # load a save file, can be changed to intake json/hashmap later
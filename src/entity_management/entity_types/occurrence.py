@@ -0,0 +1,9 @@
+from typing import NamedTuple
+
+class Occurrence(NamedTuple):
+    ''' A single NER hit, start/end are chapter absolute character offsets '''
+    surface: str
+    label: str
+    start: int
+    end: int
+    score: float
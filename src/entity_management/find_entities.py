@@ -2,7 +2,7 @@ import sys
 import os
 
 from .models.gemini_ner_nodel import Gemini_NER_Model
-from .models.hugging_ner_model import NER_Model
+from .models.ner_service import NERService
 
 class OccurrenceFinder:
     '''
@@ -10,12 +10,16 @@ class OccurrenceFinder:
     Has the option of using gemini for further NER searching and some entity unification
     can be expensive though, lot of queries
     '''
-    ner_model = NER_Model
+    @staticmethod
+    def ner_model():
+        # the shared, lazily loaded NER service rather than a model per call
+        return NERService.get()
+
     @staticmethod
     def find_occurrence(text):
         # For now NER only, gemini second layer elsewhere
 
-        ner_model = OccurrenceFinder.ner_model
+        ner_model = OccurrenceFinder.ner_model()
         occurrences = ner_model.get_entities(text)
 
         '''
@@ -40,4 +44,13 @@ class OccurrenceFinder:
         llm_model = Gemini_NER_Model() if use_extra_gemini_ner else NER_Model()
         full_text = ""
         '''
-        return occurrences
\ No newline at end of file
+        return occurrences
+
+    @staticmethod
+    def find_occurrences_batch(chapter_texts, batch_size=None):
+        '''
+        find_occurrence over many chapters with one batched NER run, chapter_texts maps chapter_idx -> text
+        Returns chapter_idx -> list of positional Occurrences, one per hit so repeats are kept
+        '''
+        ner_model = OccurrenceFinder.ner_model()
+        return ner_model.get_entities_batch(chapter_texts, batch_size)
\ No newline at end of file
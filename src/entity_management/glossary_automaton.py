@@ -0,0 +1,121 @@
+from collections import deque
+
+class GlossaryAutomaton():
+    '''
+    Aho-Corasick automaton compiled once from every glossary entity
+    Finds all entity hits in a single pass over a segment, so matching cost no longer grows with glossary size
+    Supports case insensitive matching, regex style word boundaries and longest match wins overlap resolution
+    '''
+    def __init__(self, patterns, case_insensitive=True, word_boundaries=True):
+        '''
+        patterns is an iterable of (pattern, payload), payload is handed back with every hit of that pattern
+        '''
+        self.case_insensitive = case_insensitive
+        self.word_boundaries = word_boundaries
+        self.payloads = []
+        self.lengths = []
+
+        # state 0 is the root, goto[state] maps a character to the next state
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            self._add_pattern(self._fold(pattern), payload)
+        self._build_failure_links()
+
+    def _fold(self, text):
+        if not self.case_insensitive:
+            return text
+        folded = text.lower()
+        if len(folded) == len(text):
+            return folded
+        # a few characters change length when lowered (e.g. 'İ'), keep those as is so offsets still line up
+        return "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+    def _add_pattern(self, pattern, payload):
+        state = 0
+        for ch in pattern:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(len(self.payloads))
+        self.payloads.append(payload)
+        self.lengths.append(len(pattern))
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(ch, 0)
+                # inherit the outputs of the longest proper suffix that is itself a pattern
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    @staticmethod
+    def _is_word(ch):
+        # same characters as regex \w
+        return ch.isalnum() or ch == "_"
+
+    def _on_boundary(self, text, start, end):
+        '''
+        Mirrors wrapping the pattern in \\b...\\b
+        '''
+        before_is_word = start > 0 and self._is_word(text[start - 1])
+        after_is_word = end < len(text) and self._is_word(text[end])
+        return (before_is_word != self._is_word(text[start])) and (self._is_word(text[end - 1]) != after_is_word)
+
+    def find_all(self, text):
+        '''
+        Every (start, end, payload) hit in the text, overlapping hits included
+        '''
+        hits = []
+        folded = self._fold(text)
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for i, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in output[state]:
+                end = i + 1
+                start = end - self.lengths[pattern_id]
+                if self.word_boundaries and not self._on_boundary(text, start, end):
+                    continue
+                hits.append((start, end, self.payloads[pattern_id]))
+        return hits
+
+    @staticmethod
+    def resolve_overlaps(hits):
+        '''
+        Keeps non overlapping hits, longest first then earliest, returned in text order
+        '''
+        accepted = []
+        taken = set()
+        for start, end, payload in sorted(hits, key=lambda hit: (hit[0] - hit[1], hit[0])):
+            if any(position in taken for position in range(start, end)):
+                continue
+            taken.update(range(start, end))
+            accepted.append((start, end, payload))
+        accepted.sort(key=lambda hit: hit[0])
+        return accepted
+
+    def find_matches(self, text):
+        '''
+        Non overlapping hits in text order, longest match wins
+        '''
+        return self.resolve_overlaps(self.find_all(text))
+
+    def __len__(self):
+        return len(self.payloads)
@@ -0,0 +1,51 @@
+class LemmaTrie():
+    '''
+    Trie over the lemma token sequences of the glossary, e.g. "crimson lotus slash" is three edges deep
+    Lets multi word glossary terms match in inflected form, and matches a whole doc in one walk
+    Lemmas are compared lowercased
+    '''
+    def __init__(self, entries):
+        '''
+        entries is an iterable of (lemmatized entity, payload), the lemmatized entity is split on whitespace
+        The first payload added for a token sequence is kept
+        '''
+        self.root = {}
+        self.size = 0
+        self.max_depth = 0
+        for lemmatized_entity, payload in entries:
+            if not lemmatized_entity:
+                continue
+            tokens = lemmatized_entity.lower().split()
+            if tokens:
+                self._add(tokens, payload)
+
+    def _add(self, tokens, payload):
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # None can't collide with a lemma, so it marks the end of an entry
+        if None not in node:
+            node[None] = payload
+            self.size += 1
+            self.max_depth = max(self.max_depth, len(tokens))
+
+    def find_all(self, lemma_tokens):
+        '''
+        lemma_tokens is a list of (lemma, start, end) as from SpacyLemmatizer.lemma_tokens_from_doc
+        Returns every (start, end, payload) hit, the span runs from the first token's start to the last token's end
+        Overlapping hits are included, walks are bounded by the longest entry so this is linear in the doc
+        '''
+        hits = []
+        lemmas = [lemma.lower() for lemma, _, _ in lemma_tokens]
+        for i in range(len(lemmas)):
+            node = self.root
+            for j in range(i, min(len(lemmas), i + self.max_depth)):
+                node = node.get(lemmas[j])
+                if node is None:
+                    break
+                if None in node:
+                    hits.append((lemma_tokens[i][1], lemma_tokens[j][2], node[None]))
+        return hits
+
+    def __len__(self):
+        return self.size
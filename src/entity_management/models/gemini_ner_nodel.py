@@ -1,74 +1,243 @@
-import google.generativeai as genai
 import re
 import os
+import json
+import asyncio
+import weakref
+from functools import lru_cache
+
+from google import genai
 from ...utils.model_settings import Model_Utility_Class
+from ...utils.response_cache import ResponseCache
 
 # Get project root dynamically
 current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
+project_root = os.path.abspath(os.path.join(current_dir, '..', '..', '..'))
 
 FIND_NAMED_ENTITIES_PROMPT = os.path.join(project_root, "prompts", "find_named_entities.txt")
 FIND_NAMES_PROMPT = os.path.join(project_root, "prompts", "find_proper_names.txt")
+FIND_NAMED_ENTITIES_BATCHED_PROMPT = os.path.join(project_root, "prompts", "find_named_entities_batched.txt")
+
+# rough size of a token for packing batches, about 4 characters in English prose
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def load_prompt(path):
+    ''' Prompt files are read once per process '''
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def parse_csv_response(raw_text):
+    '''
+    Comma separated entities from a model reply, code fences and "null" entries dropped
+    '''
+    raw_text = (raw_text or "").strip()
+    if raw_text.startswith("```"):
+        raw_text = re.sub(r"^```(?:csv)?\n", "", raw_text)
+        raw_text = re.sub(r"\n```$", "", raw_text)
+
+    try:
+        # Split by commas and strip whitespace from each name
+        objects = [name.strip() for name in raw_text.split(",") if name.strip()]
+        return [object for object in objects if object.lower() != "null"]
+    except Exception as e:
+        print(f"Failed to parse CSV: {raw_text}\nError: {e}")
+        return []
+
+def format_batched_input(paragraphs):
+    '''
+    Paragraphs wrapped in id tags for the batched prompt, paragraphs is a list of (id, text)
+    '''
+    return "\n".join(f'<p id="{paragraph_id}">\n{text}\n</p>' for paragraph_id, text in paragraphs)
+
+def parse_batched_response(raw_text, paragraph_ids):
+    '''
+    paragraph id -> entities from a batched JSON reply, ids missing or malformed in the reply are left out
+    Tolerates code fences and text around the JSON object, entity lists given as CSV strings are split
+    '''
+    raw_text = (raw_text or "").strip()
+    start, end = raw_text.find("{"), raw_text.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        data = json.loads(raw_text[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    parsed = {}
+    for paragraph_id in paragraph_ids:
+        value = data.get(str(paragraph_id))
+        if isinstance(value, str):
+            value = parse_csv_response(value)
+        if not isinstance(value, list):
+            continue
+        parsed[paragraph_id] = [str(entity).strip() for entity in value
+                                if str(entity).strip() and str(entity).strip().lower() != "null"]
+    return parsed
+
+def pack_paragraphs(paragraphs, token_budget):
+    '''
+    Greedily packs (id, text) paragraphs into batches of at most token_budget estimated tokens
+    A paragraph over the budget on its own still gets a batch
+    '''
+    batches, batch, batch_tokens = [], [], 0
+    for paragraph_id, text in paragraphs:
+        # the id tags cost a few tokens on top of the text
+        tokens = len(text) // CHARS_PER_TOKEN + 8
+        if batch and batch_tokens + tokens > token_budget:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append((paragraph_id, text))
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+class _ClientPool():
+    '''
+    One google.genai Client per API key, built on first use and reused
+    Keys still rotate through Model_Utility_Class.get_next_key, nothing is configured process wide
+    '''
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.clients = {}
+
+    def next_client(self):
+        key = Model_Utility_Class.get_next_key(self.model_name)
+        if key not in self.clients:
+            self.clients[key] = genai.Client(api_key=key)
+        return self.clients[key]
 
 # "gemini-2.5-pro"
 # "gemini-2.0-flash"
 class Gemini_NER_Model():
-    def __init__(self):
-        pass
+    def __init__(self, model_name=Model_Utility_Class.GEMINI_NER_MODEL):
+        self.model_name = model_name
+        self.client_pool = _ClientPool(model_name)
+
+    def _generate(self, template, text):
+        # identical template + text pairs are served from the response cache
+        cache = ResponseCache.shared()
+        if cache is not None:
+            cached = cache.get(self.model_name, template, text)
+            if cached is not None:
+                return cached
+        response = self.client_pool.next_client().models.generate_content(model=self.model_name, contents=template + "\n" + text)
+        if cache is not None:
+            cache.put(self.model_name, template, text, response.text)
+        return response.text
 
     def get_names(self, paragraph):
-        genai.configure(api_key=Model_Utility_Class.get_next_key(Model_Utility_Class.GEMINI_NER_MODEL))
-        model = genai.GenerativeModel(Model_Utility_Class.GEMINI_NER_MODEL)  
-        with open(FIND_NAMES_PROMPT, "r", encoding="utf-8") as f:
-            prompt = f.read()
-            prompt += "\n" + paragraph
-            response = model.generate_content(prompt)
-            raw_text = response.text.strip()
-
-        if raw_text.startswith("```"):
-            raw_text = re.sub(r"^```(?:csv)?\n", "", raw_text)
-            raw_text = re.sub(r"\n```$", "", raw_text)
-
-        try:
-            # Split by commas and strip whitespace from each name
-            names = [name.strip() for name in raw_text.split(",") if name.strip()]
-            names = [name for name in names if name.lower()!="null"]
-        except Exception as e:
-            print(f"Failed to parse CSV: {raw_text}\nError: {e}")
-            names = []
-
-        return names
-    
+        return parse_csv_response(self._generate(load_prompt(FIND_NAMES_PROMPT), paragraph))
+
     def get_entities(self, text):
-        genai.configure(api_key=Model_Utility_Class.get_next_key(Model_Utility_Class.GEMINI_NER_MODEL))
-        model = genai.GenerativeModel(Model_Utility_Class.GEMINI_NER_MODEL)  
-        with open(FIND_NAMED_ENTITIES_PROMPT, "r", encoding="utf-8") as f:
-            prompt = f.read()
-            prompt += "\n" + text
-            response = model.generate_content(prompt)
-            raw_text = response.text.strip()
-
-        if raw_text.startswith("```"):
-            raw_text = re.sub(r"^```(?:csv)?\n", "", raw_text)
-            raw_text = re.sub(r"\n```$", "", raw_text)
-
-        try:
-            # Split by commas and strip whitespace from each name
-            objects = [name.strip() for name in raw_text.split(",") if name.strip()]
-            objects = [object for object in objects if object.lower()!="null"]
-        except Exception as e:
-            print(f"Failed to parse CSV: {raw_text}\nError: {e}")
-            objects = []
-
-        return objects
-    
-    def get_entities_with_unification(self,text,entities):
-        genai.configure(api_key=Model_Utility_Class.get_next_key(Model_Utility_Class.GEMINI_NER_MODEL))
-        model = genai.GenerativeModel(Model_Utility_Class.GEMINI_NER_MODEL)  
-        with open(FIND_NAMED_ENTITIES_PROMPT, "r", encoding="utf-8") as f:
-            prompt = f.read()
-            prompt += "\n" + text
-        
-        response = model.generate_content(prompt)
-        raw_text = response.text.strip() 
-        
+        return parse_csv_response(self._generate(load_prompt(FIND_NAMED_ENTITIES_PROMPT), text))
+
+class Async_Gemini_NER_Model():
+    '''
+    asyncio Gemini NER, requests fan out per paragraph through client.aio
+    At most max_concurrency requests are in flight per event loop, each is cut off after timeout seconds and retried on the next key
+    '''
+    def __init__(self, model_name=Model_Utility_Class.GEMINI_NER_MODEL, max_concurrency=8, timeout=60.0, retries=2):
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        # event loop -> (semaphore, client pool), dropped along with the loop
+        self._loop_states = weakref.WeakKeyDictionary()
+
+    def _loop_state(self):
+        '''
+        (semaphore, client pool) of the running event loop
+        Both bind to the loop they are first used on, so a model reused across asyncio.run calls gets fresh ones per loop
+        '''
+        loop = asyncio.get_running_loop()
+        state = self._loop_states.get(loop)
+        if state is None:
+            state = (asyncio.Semaphore(self.max_concurrency), _ClientPool(self.model_name))
+            self._loop_states[loop] = state
+        return state
+
+    async def _generate(self, template, text):
+        '''
+        Model reply text, None once every attempt failed or timed out
+        '''
+        cache = ResponseCache.shared()
+        if cache is not None:
+            cached = cache.get(self.model_name, template, text)
+            if cached is not None:
+                return cached
+        prompt = template + "\n" + text
+        semaphore, client_pool = self._loop_state()
+        for attempt in range(self.retries + 1):
+            try:
+                # the slot is held per attempt, acquiring it is inside the handler so a failure there is one failed attempt
+                async with semaphore:
+                    client = client_pool.next_client()
+                    response = await asyncio.wait_for(
+                        client.aio.models.generate_content(model=self.model_name, contents=prompt), self.timeout
+                    )
+                if cache is not None:
+                    cache.put(self.model_name, template, text, response.text)
+                return response.text
+            except asyncio.TimeoutError:
+                print(f"Gemini NER request timed out after {self.timeout}s (attempt {attempt + 1})")
+            except Exception as e:
+                print(f"Gemini NER request failed (attempt {attempt + 1}): {e}")
+        return None
+
+    async def get_names(self, paragraph):
+        return parse_csv_response(await self._generate(load_prompt(FIND_NAMES_PROMPT), paragraph))
+
+    async def get_entities(self, text):
+        return parse_csv_response(await self._generate(load_prompt(FIND_NAMED_ENTITIES_PROMPT), text))
+
+    async def get_entities_batch(self, texts):
+        '''
+        get_entities over many texts concurrently, results are in input order
+        '''
+        return await asyncio.gather(*(self.get_entities(text) for text in texts))
+
+    async def get_entities_batched(self, texts, token_budget=6000):
+        '''
+        get_entities over many texts with several texts per request, results are in input order
+        Texts are packed up to token_budget, so the instruction block is sent once per batch rather than per text
+        '''
+        batches = pack_paragraphs(list(enumerate(texts)), token_budget)
+        results = await asyncio.gather(*(self._run_batch(batch) for batch in batches))
+        merged = {}
+        for batch_result in results:
+            merged.update(batch_result)
+        print(f"Batched Gemini NER: {len(texts)} paragraphs in {len(batches)} requests")
+        return [merged.get(i, []) for i in range(len(texts))]
+
+    async def _run_batch(self, batch):
+        '''
+        paragraph id -> entities for one batch, paragraphs the reply doesn't cover are retried in halves
+        A single paragraph that still fails falls back to the one paragraph prompt
+        '''
+        if len(batch) == 1:
+            paragraph_id, text = batch[0]
+            parsed = parse_batched_response(
+                await self._generate(load_prompt(FIND_NAMED_ENTITIES_BATCHED_PROMPT), format_batched_input(batch)), [paragraph_id]
+            )
+            if paragraph_id not in parsed:
+                parsed[paragraph_id] = await self.get_entities(text)
+            return parsed
+
+        paragraph_ids = [paragraph_id for paragraph_id, _ in batch]
+        parsed = parse_batched_response(
+            await self._generate(load_prompt(FIND_NAMED_ENTITIES_BATCHED_PROMPT), format_batched_input(batch)), paragraph_ids
+        )
+        missing = [(paragraph_id, text) for paragraph_id, text in batch if paragraph_id not in parsed]
+        if missing:
+            if len(missing) < len(batch):
+                halves = [missing]
+            else:
+                print(f"Batched NER reply for {len(batch)} paragraphs could not be parsed, splitting the batch")
+                middle = len(missing) // 2
+                halves = [missing[:middle], missing[middle:]]
+            for half_result in await asyncio.gather(*(self._run_batch(half) for half in halves if half)):
+                parsed.update(half_result)
+        return parsed
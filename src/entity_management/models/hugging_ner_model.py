@@ -1,65 +1,170 @@
+import os
+import time
+import contextlib
+
+import torch
 from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
 
+from ..entity_types.occurrence import Occurrence
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
 class NER_Model():
-    def __init__(self, model_name="dslim/bert-base-NER"):
+    '''
+    HuggingFace token classification NER, backend is "torch" (eager PyTorch) or "onnx" (ONNX Runtime)
+    The onnx backend exports the model once to onnx_dir and can dynamically quantize it to int8 for CPU nodes
+    '''
+    backends = ("torch", "onnx")
+
+    def __init__(self, model_name="dslim/bert-base-NER", batch_size=16, backend="torch", quantize=False, onnx_dir=None):
+        if backend not in self.backends:
+            raise ValueError(f"Unknown NER backend {backend}, expected one of {self.backends}")
+        self.model_name = model_name
+        self.backend = backend
+        self.quantize = quantize
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForTokenClassification.from_pretrained(model_name)
+        if backend == "onnx":
+            self.model = self._load_onnx_model(model_name, quantize, onnx_dir)
+        else:
+            self.model = AutoModelForTokenClassification.from_pretrained(model_name)
+            self.model.eval()
         self.pipeline = pipeline("ner", model=self.model, tokenizer=self.tokenizer, aggregation_strategy="max")
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _load_onnx_model(model_name, quantize, onnx_dir=None):
+        '''
+        Exports model_name to ONNX on first use, quantized weights are saved next to the fp32 export
+        '''
+        try:
+            from optimum.onnxruntime import ORTModelForTokenClassification, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        except ImportError as e:
+            raise ImportError("The onnx NER backend needs optimum with onnxruntime: pip install optimum[onnxruntime]") from e
+
+        onnx_dir = onnx_dir or os.path.join(PROJECT_ROOT, "data", "cache", "onnx", model_name.replace("/", "__"))
+        if not os.path.exists(os.path.join(onnx_dir, "model.onnx")):
+            print(f"Exporting {model_name} to ONNX in {onnx_dir}")
+            exported = ORTModelForTokenClassification.from_pretrained(model_name, export=True)
+            exported.save_pretrained(onnx_dir)
+
+        if not quantize:
+            return ORTModelForTokenClassification.from_pretrained(onnx_dir, file_name="model.onnx")
+
+        if not os.path.exists(os.path.join(onnx_dir, "model_quantized.onnx")):
+            print(f"Quantizing {model_name} to int8")
+            quantizer = ORTQuantizer.from_pretrained(onnx_dir, file_name="model.onnx")
+            # dynamic quantization needs no calibration data, avx2 kernels run on any recent x86 CPU
+            quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=onnx_dir, quantization_config=quantization_config)
+        return ORTModelForTokenClassification.from_pretrained(onnx_dir, file_name="model_quantized.onnx")
+
+    def _inference_context(self):
+        # ONNX Runtime keeps no autograd state, only the torch backend needs inference mode
+        return torch.inference_mode() if self.backend == "torch" else contextlib.nullcontext()
 
     def _chunk_text(self, text, max_tokens=400, stride=50):
+        return [chunk for _, chunk in self._chunk_text_with_offsets(text, max_tokens, stride)]
+
+    def _chunk_text_with_offsets(self, text, max_tokens=400, stride=50):
         """
-        Splits text into overlapping chunks using character-based approach first,
-        then validates with tokenizer. This avoids tokenizing very long texts upfront.
+        Splits text into overlapping windows of at most max_tokens tokens, stride tokens shared between neighbours.
+        The text is tokenized once, windows are cut from the offset mapping and snapped to word starts.
+        Returns (offset of the chunk in text, chunk) pairs.
         """
         # Handle empty or very short text
         if not text or len(text.strip()) < 10:
-            return [text] if text else []
-        
-        # Use character-based chunking first (rough estimate: ~4 chars per token)
-        max_chars = max_tokens * 4
-        stride_chars = stride * 4
-        
+            return [(0, text)] if text else []
+
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                                  return_attention_mask=False, verbose=False)
+        offsets = encoding['offset_mapping']
+        word_ids = encoding.word_ids()
+        token_count = len(offsets)
+        if token_count == 0:
+            return []
+
+        def word_start(i):
+            # back up to the first sub token of the word token i belongs to
+            while i > 0 and word_ids[i] is not None and word_ids[i] == word_ids[i - 1]:
+                i -= 1
+            return i
+
         chunks = []
-        start = 0
-        
-        while start < len(text):
-            # Get character-based chunk
-            end = min(start + max_chars, len(text))
-            char_chunk = text[start:end]
-            
-            # Validate and adjust chunk size using tokenizer
-            tokens = self.tokenizer(char_chunk, add_special_tokens=False, return_tensors=None)['input_ids']
-            
-            # If chunk is too long, reduce it
-            while len(tokens) > max_tokens and len(char_chunk) > 100:
-                # Reduce chunk size by 20%
-                char_chunk = char_chunk[:int(len(char_chunk) * 0.8)]
-                tokens = self.tokenizer(char_chunk, add_special_tokens=False, return_tensors=None)['input_ids']
-            
-            # Only add non-empty chunks
-            if char_chunk.strip():
-                chunks.append(char_chunk.strip())
-            
-            # If we've reached the end, break
-            if start + len(char_chunk) >= len(text):
+        first = 0
+        while True:
+            last = min(first + max_tokens, token_count)
+            if last < token_count:
+                # don't cut a word in half unless the word alone fills the window
+                snapped = word_start(last)
+                if snapped > first:
+                    last = snapped
+            start_char, end_char = offsets[first][0], offsets[last - 1][1]
+            chunks.append((start_char, text[start_char:end_char]))
+            if last >= token_count:
                 break
-                
-            # Move start position with overlap
-            start = start + len(char_chunk) - stride_chars
-            
+            next_first = word_start(max(last - stride, first + 1))
+            first = next_first if next_first > first else last
         return chunks
 
+    @staticmethod
+    def _dedupe_overlaps(entities):
+        """
+        Overlapping windows find the same entity twice, keeps one per position
+        An entity inside a longer one is a window edge cutting it, so only the longer is kept
+        """
+        kept = []
+        for ent in sorted(entities, key=lambda e: (e.start, e.start - e.end, -e.score)):
+            if kept and ent.start >= kept[-1].start and ent.end <= kept[-1].end:
+                continue
+            kept.append(ent)
+        return kept
+
+    def get_entities_batch(self, chapter_texts, batch_size=None):
+        """
+        Runs NER over the chunks of many chapters at once, chapter_texts maps chapter_idx -> text
+        Chunks are sorted by length into buckets so each batch pads to a similar length
+        Returns chapter_idx -> list of Occurrence (surface, label, start, end, score) in text order, offsets are chapter absolute
+        Hits repeated by overlapping windows are dropped by position
+        """
+        batch_size = batch_size or self.batch_size
+        chunks = []  # (chapter_idx, chunk offset, chunk)
+        for chapter_idx, text in chapter_texts.items():
+            for offset, chunk in self._chunk_text_with_offsets(text):
+                chunks.append((chapter_idx, offset, chunk))
+
+        results = {chapter_idx: [] for chapter_idx in chapter_texts}
+        if not chunks:
+            return results
+
+        # longest first, so neighbouring chunks in a batch have about the same token count
+        chunks.sort(key=lambda item: len(item[2]), reverse=True)
+        start_time = time.perf_counter()
+        with self._inference_context():
+            for i in range(0, len(chunks), batch_size):
+                bucket = chunks[i:i + batch_size]
+                outputs = self.pipeline([chunk for _, _, chunk in bucket], batch_size=batch_size)
+                for (chapter_idx, offset, _), entities in zip(bucket, outputs):
+                    for ent in entities:
+                        results[chapter_idx].append(Occurrence(
+                            ent["word"], ent["entity_group"], offset + ent["start"], offset + ent["end"], float(ent["score"])
+                        ))
+
+        for chapter_idx in results:
+            results[chapter_idx] = self._dedupe_overlaps(results[chapter_idx])
+
+        elapsed = time.perf_counter() - start_time
+        rate = len(chunks) / elapsed if elapsed else float("inf")
+        print(f"NER over {len(chunks)} chunks from {len(chapter_texts)} chapters in {elapsed:.2f}s "
+              f"({rate:.2f} chunks/s, batch_size={batch_size}, backend={self.backend}{', int8' if self.quantize else ''})")
+        return results
+
     def get_names(self, text):
-        names = set()
-        for chunk in self._chunk_text(text):
-            entities = self.pipeline(chunk)
-            names.update({entity['word'] for entity in entities if entity['entity_group'] == 'PER'})
+        names = {occurrence.surface for occurrence in self.get_entities_batch({0: text})[0] if occurrence.label == 'PER'}
         return list(names)
 
     def get_entities(self, text):
         entity_set = set()
-        for chunk in self._chunk_text(text):
-            entities = self.pipeline(chunk)
-            for ent in entities:
-                entity_set.add(ent['word'])
-        return entity_set
\ No newline at end of file
+        for ent in self.get_entities_batch({0: text})[0]:
+            entity_set.add(ent.surface)
+        return entity_set
@@ -0,0 +1,120 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+from .hugging_ner_model import NER_Model
+
+# model held by each worker process, loaded once by _init_worker
+_worker_model = None
+
+def _init_worker(model_settings, torch_threads):
+    global _worker_model
+    # pinned thread counts so N workers don't each spawn a thread per core
+    torch.set_num_threads(torch_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    _worker_model = NER_Model(**model_settings)
+
+def _run_worker_batch(chapter_texts, batch_size):
+    return _worker_model.get_entities_batch(chapter_texts, batch_size)
+
+class NERService():
+    '''
+    The shared NER model, loaded lazily once and reused by every EntityManager/OccurrenceFinder call
+    With workers > 1 chapters are instead spread over worker processes, each holding its own model
+    and pinned to cpu_count // workers torch threads, pulling groups of chapters from the pool's queue
+    '''
+    _instance = None
+    _lock = threading.Lock()
+    settings = {}
+
+    def __init__(self, model_name="dslim/bert-base-NER", batch_size=16, backend="torch", quantize=False, workers=1, torch_threads=None):
+        self.model_settings = {"model_name": model_name, "batch_size": batch_size, "backend": backend, "quantize": quantize}
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self._model = None
+        self._executor = None
+
+    @classmethod
+    def configure(cls, **settings):
+        '''
+        Sets the settings the shared service is built with, a running service with other settings is closed
+        '''
+        with cls._lock:
+            if settings == cls.settings:
+                return
+            cls.settings = settings
+            if cls._instance is not None:
+                cls._instance.close()
+                cls._instance = None
+
+    @classmethod
+    def get(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(**cls.settings)
+            return cls._instance
+
+    @classmethod
+    def shutdown(cls):
+        with cls._lock:
+            if cls._instance is not None:
+                cls._instance.close()
+                cls._instance = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = NER_Model(**self.model_settings)
+        return self._model
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn, forking a process which already started torch threads can deadlock
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_settings, self.torch_threads)
+            )
+        return self._executor
+
+    def get_entities_batch(self, chapter_texts, batch_size=None):
+        '''
+        Same as NER_Model.get_entities_batch, spread over the worker processes when there are several
+        '''
+        batch_size = batch_size or self.batch_size
+        if self.workers == 1 or len(chapter_texts) < 2:
+            return self.model.get_entities_batch(chapter_texts, batch_size)
+
+        # longest chapters dealt out first round robin, so groups hold about the same amount of text
+        group_count = min(len(chapter_texts), self.workers * 4)
+        groups = [{} for _ in range(group_count)]
+        ordered = sorted(chapter_texts, key=lambda chapter_idx: len(chapter_texts[chapter_idx]), reverse=True)
+        for i, chapter_idx in enumerate(ordered):
+            groups[i % group_count][chapter_idx] = chapter_texts[chapter_idx]
+
+        executor = self._get_executor()
+        futures = [executor.submit(_run_worker_batch, group, batch_size) for group in groups]
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        return {chapter_idx: results[chapter_idx] for chapter_idx in chapter_texts}
+
+    def get_entities(self, text):
+        return self.model.get_entities(text)
+
+    def get_names(self, text):
+        return self.model.get_names(text)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._model = None
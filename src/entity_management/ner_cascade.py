@@ -0,0 +1,183 @@
+import re
+import asyncio
+import logging
+import threading
+from collections import Counter
+
+from .entity_types.occurrence import Occurrence
+
+PARAGRAPH_SEPARATOR = "\n\n"
+
+# runs of capitalised words, e.g. "Crimson Lotus Slash" or "Tingen"
+CAPITALISED_NGRAM = re.compile(r"\b[A-Z][\w'\-]*(?:\s+[A-Z][\w'\-]*)*")
+SENTENCE_START = re.compile(r"(?:^|[.!?:;\"“”'‘’—]\s*)$")
+
+class NERCascade():
+    '''
+    Confidence gated NER, the local model runs over everything and only paragraphs it looks unsure about go to Gemini
+    A paragraph is escalated when a local hit scores below score_threshold, when a local hit isn't a known entity yet,
+    or when it has capitalised n-grams the local model didn't tag and which aren't known entities
+    LLM NER cost then follows how much new material a chapter has rather than its length
+    '''
+    def __init__(self, gemini_model=None, score_threshold=0.9, min_unknown_ngrams=1, escalate_all=False,
+                 batched=True, token_budget=6000):
+        self.logger = logging.getLogger(__name__)
+        self._gemini_model = gemini_model
+        self.score_threshold = score_threshold
+        self.min_unknown_ngrams = min_unknown_ngrams
+        # the old all or nothing behaviour, every paragraph goes to Gemini
+        self.escalate_all = escalate_all
+        self.batched = batched
+        self.token_budget = token_budget
+        self.paragraph_count = 0
+        self.escalation_reasons = Counter()
+        self._loop = None
+        self._loop_thread = None
+
+    @property
+    def gemini_model(self):
+        if self._gemini_model is None:
+            from .models.gemini_ner_nodel import Async_Gemini_NER_Model
+            self._gemini_model = Async_Gemini_NER_Model()
+        return self._gemini_model
+
+    def _run(self, coroutine):
+        '''
+        Runs a coroutine on the cascade's own event loop and waits for it
+        EntityManager is synchronous and may be called from inside the pipeline's running loop, so the loop lives
+        in a background thread, and it is the same loop every call so the Gemini clients stay bound to it
+        '''
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name="ner-cascade-loop", daemon=True)
+            self._loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+        self._loop_thread = None
+
+    @staticmethod
+    def _paragraph_spans(text, separator=PARAGRAPH_SEPARATOR):
+        spans = []
+        start = 0
+        while True:
+            end = text.find(separator, start)
+            if end == -1:
+                end = len(text)
+            if text[start:end].strip():
+                spans.append((start, end))
+            if end == len(text):
+                return spans
+            start = end + len(separator)
+
+    def _unknown_ngrams(self, text, paragraph_start, occurrences, known_entities):
+        covered = [(occurrence.start - paragraph_start, occurrence.end - paragraph_start) for occurrence in occurrences]
+        unknown = []
+        for match in CAPITALISED_NGRAM.finditer(text):
+            ngram = match.group()
+            # a lone capitalised word opening a sentence is usually just capitalisation
+            if " " not in ngram and SENTENCE_START.search(text[:match.start()]):
+                continue
+            if ngram in known_entities:
+                continue
+            if any(start < match.end() and match.start() < end for start, end in covered):
+                continue
+            unknown.append(ngram)
+        return unknown
+
+    def escalation_reason(self, text, paragraph_start, occurrences, known_entities):
+        '''
+        Why a paragraph should go to Gemini, None when the local hits are trusted
+        occurrences are the local Occurrences within the paragraph, offsets chapter absolute
+        '''
+        if self.escalate_all:
+            return "all"
+        if any(occurrence.score < self.score_threshold for occurrence in occurrences):
+            return "low_confidence"
+        if any(occurrence.surface not in known_entities for occurrence in occurrences):
+            return "new_entity"
+        if len(self._unknown_ngrams(text, paragraph_start, occurrences, known_entities)) >= self.min_unknown_ngrams:
+            return "unknown_ngram"
+        return None
+
+    def select_paragraphs(self, chapter_texts, local_occurrences, known_entities):
+        '''
+        (chapter_idx, paragraph start, paragraph text) for every escalated paragraph, counts are kept for report
+        local_occurrences maps chapter_idx -> local NER Occurrences of that chapter
+        Paragraphs are walked in order and their local hits count as known from then on,
+        so a name is only new the first time it shows up
+        '''
+        known_entities = set(known_entities)
+        escalated = []
+        for chapter_idx, text in chapter_texts.items():
+            occurrences = sorted(local_occurrences.get(chapter_idx, []), key=lambda occurrence: occurrence.start)
+            for start, end in self._paragraph_spans(text):
+                self.paragraph_count += 1
+                inside = [occurrence for occurrence in occurrences if start <= occurrence.start < end]
+                reason = self.escalation_reason(text[start:end], start, inside, known_entities)
+                known_entities.update(occurrence.surface for occurrence in inside)
+                if reason is None:
+                    self.escalation_reasons["skipped"] += 1
+                    continue
+                self.escalation_reasons[reason] += 1
+                escalated.append((chapter_idx, start, text[start:end]))
+        return escalated
+
+    def find_extra_entities(self, chapter_texts, local_occurrences, known_entities):
+        '''
+        chapter_idx -> Occurrences of the entities Gemini found in the escalated paragraphs of each chapter
+        Gemini only returns names, so each is located in its paragraph, spans the local model already tagged are skipped
+        '''
+        escalated = self.select_paragraphs(chapter_texts, local_occurrences, known_entities)
+        extra = {chapter_idx: [] for chapter_idx in chapter_texts}
+        if not escalated:
+            return extra
+
+        paragraphs = [paragraph for _, _, paragraph in escalated]
+        if self.batched:
+            results = self._run(self.gemini_model.get_entities_batched(paragraphs, self.token_budget))
+        else:
+            results = self._run(self.gemini_model.get_entities_batch(paragraphs))
+        for (chapter_idx, paragraph_start, paragraph), entities in zip(escalated, results):
+            covered = [(occurrence.start, occurrence.end) for occurrence in local_occurrences.get(chapter_idx, [])]
+            extra[chapter_idx].extend(self._locate(paragraph, paragraph_start, entities, covered))
+        return extra
+
+    @staticmethod
+    def _locate(paragraph, paragraph_start, entities, covered):
+        '''
+        Chapter absolute Occurrences for every place a Gemini entity appears in the paragraph, outside covered spans
+        '''
+        located = []
+        covered = list(covered)
+        # longest first, so "Klein Moretti" claims its span before "Klein" could
+        for entity in sorted(set(entities), key=len, reverse=True):
+            for match in re.finditer(r"(?<!\w)" + re.escape(entity) + r"(?!\w)", paragraph):
+                start, end = paragraph_start + match.start(), paragraph_start + match.end()
+                if any(covered_start < end and start < covered_end for covered_start, covered_end in covered):
+                    continue
+                located.append(Occurrence(entity, "LLM", start, end, 1.0))
+                covered.append((start, end))
+        return sorted(located, key=lambda occurrence: occurrence.start)
+
+    def stats(self):
+        escalated = sum(count for reason, count in self.escalation_reasons.items() if reason != "skipped")
+        return {
+            "paragraphs": self.paragraph_count,
+            "escalated": escalated,
+            "skipped": self.escalation_reasons["skipped"],
+            "reasons": {reason: count for reason, count in self.escalation_reasons.items() if reason != "skipped"}
+        }
+
+    def report(self):
+        stats = self.stats()
+        share = stats["escalated"] / stats["paragraphs"] if stats["paragraphs"] else 0.0
+        self.logger.info(f"NER cascade: {stats['escalated']} of {stats['paragraphs']} paragraphs escalated to Gemini ({share:.1%}), "
+                         f"{stats['skipped']} skipped, reasons {stats['reasons']}")
+        return stats
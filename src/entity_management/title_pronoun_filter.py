@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 from collections import defaultdict
 from lingua import Language
@@ -18,13 +19,16 @@ class NERFilter():
         Language.FRENCH: 'FRENCH'
     }
 
-    name_df = pd.read_csv("language_titles_pronouns.csv")
+    # resolved from this file so importing doesn't depend on the working directory
+    titles_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "titles")
+
+    name_df = pd.read_csv(os.path.join(titles_dir, "language_titles_pronouns.csv"))
 
     base_name_map = defaultdict(set)
     for _, row in name_df.iterrows():
         base_name_map[row["Language"]].add(row["Word"])
 
-    extensive_name_df = pd.read_csv("extensive_language_titles_pronouns.csv")
+    extensive_name_df = pd.read_csv(os.path.join(titles_dir, "extensive_language_titles_pronouns.csv"))
     extensive_name_map = defaultdict(set)
     for _, row in extensive_name_df.iterrows():
         extensive_name_map[row["Language"]].add(row["Word"])
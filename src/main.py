@@ -20,9 +20,14 @@ if project_root not in sys.path:
 
 
 from src.data_manager.file_manager import FileManager
+from src.data_manager.chapter_manifest import ChapterManifest
+from src.data_manager.lemmatizer import SpacyLemmatizer
 from src.entity_management.find_entities import OccurrenceFinder
+from src.entity_management.models.ner_service import NERService
+from src.utils.response_cache import ResponseCache
 from src.rag_database.base_rag import RAGDatabase
 from src.entity_management.entity_manager import EntityManager
+from src.entity_management.ner_cascade import NERCascade
 
 
 @dataclass
@@ -31,6 +36,32 @@ class PipelineConfig:
     source_folder: str
     start_idx: int = 0
     use_extra_gemini_ner: bool = True
+    gemini_ner_cascade: bool = True  # only escalate paragraphs the local NER is unsure about, False sends every paragraph
+    gemini_ner_concurrency: int = 8
+    ner_cascade_score_threshold: float = 0.9
+    use_artifact_cache: bool = True
+    artifact_cache_path: Optional[str] = None
+    streaming: bool = False
+    corpus_store_dir: Optional[str] = None
+    lemmatize_batch_size: int = 16
+    lemmatize_n_process: int = 1
+    tag_chapter_languages: bool = False
+    incremental: bool = False
+    state_dir: Optional[str] = None
+    lemma_cache_path: Optional[str] = None
+    spacy_warm_up_variants: tuple = ('lemmatizer',)
+    inline_annotations: bool = True
+    annotation_store_path: Optional[str] = None
+    annotation_workers: int = 1
+    ner_batch_size: int = 16
+    ner_backend: str = "torch"
+    ner_quantize: bool = False
+    ner_workers: int = 1
+    ner_torch_threads: Optional[int] = None
+    use_response_cache: bool = True
+    response_cache_path: Optional[str] = None
+    response_cache_ttl_days: Optional[float] = None
+    response_cache_max_entries: Optional[int] = None
     
     @classmethod
     def create_default(cls, project_root: str) -> 'PipelineConfig':
@@ -51,6 +82,27 @@ class TranslationPipeline:
         self.rag_database: Optional[RAGDatabase] = None
         self.entity_finder: Optional[OccurrenceFinder] = None
         self.entity_matcher: Optional[EntityManager] = None
+        self.entity_manager: Optional[EntityManager] = None
+        self.corpus_store = None
+        self.ner_cascade: Optional[NERCascade] = None
+
+        # Incremental run state, only chapters in pending_chapters go through the later stages
+        state_dir = config.state_dir or os.path.join(project_root, "data", "state")
+        self.manifest_path = os.path.join(state_dir, "chapter_manifest.json")
+        self.entity_state_path = os.path.join(state_dir, "entities.json")
+        self.manifest: Optional[ChapterManifest] = None
+        self.pending_chapters: Optional[List[int]] = None
+        self.removed_chapters: List[int] = []
+        self.chapter_hashes: Dict[int, str] = {}
+        self.lemma_cache_path = config.lemma_cache_path or os.path.join(project_root, "data", "cache", "lemma_cache.json")
+
+        # Shared LLM/embedding response cache, reruns over an unchanged book are served from disk
+        ResponseCache.configure(
+            enabled=config.use_response_cache,
+            db_path=config.response_cache_path,
+            ttl_seconds=config.response_cache_ttl_days * 86400 if config.response_cache_ttl_days else None,
+            max_entries=config.response_cache_max_entries
+        )
         
         # Pipeline state
         self.file_paths: List[str] = []
@@ -92,12 +144,27 @@ class TranslationPipeline:
         except Exception as e:
             logger.error(f"Pipeline execution failed: {e}", exc_info=True)
             raise
+        finally:
+            # entity lemmas made this run are reused by the next one
+            try:
+                SpacyLemmatizer.save_lemma_cache(self.lemma_cache_path)
+            except OSError as e:
+                logger.warning(f"Could not save the lemma cache: {e}")
+            NERService.shutdown()
+            if self.ner_cascade is not None:
+                self.ner_cascade.close()
+            if self.file_manager is not None:
+                self.file_manager.close()
+            if self.corpus_store is not None:
+                self.corpus_store.close()
+            response_cache = ResponseCache.shared()
+            if response_cache is not None:
+                response_cache.report()
     
     async def _stage_1_manage_files(self) -> None:
-        #TODO epub extraction
         """
         Requires:
-        - source_folder (directory contains input files)
+        - source_folder (directory of .txt/EPUB/ZIP files, or a single EPUB/ZIP archive)
         Produces: 
         - chapter_dic (chapters hashed by chapter index)
         - lemmatised_chapter_dic (lemmatised chapters hashed by chapter index)
@@ -105,23 +172,79 @@ class TranslationPipeline:
         - resolved_chunked_chapter_dic
         """
         logger.info("Stage 1: Discovering files, indexing and lemmatising text")
+
+        loaded = SpacyLemmatizer.load_lemma_cache(self.lemma_cache_path)
+        logger.info(f"Loaded {loaded} cached entity lemmas")
         
-        file_manager = FileManager(self.config.source_folder)
+        file_manager = FileManager(
+            self.config.source_folder,
+            start_idx=self.config.start_idx,
+            use_cache=self.config.use_artifact_cache,
+            cache_path=self.config.artifact_cache_path,
+            streaming=self.config.streaming or self.config.incremental,
+            lemmatize_batch_size=self.config.lemmatize_batch_size,
+            lemmatize_n_process=self.config.lemmatize_n_process,
+            tag_chapter_languages=self.config.tag_chapter_languages
+        )
+        self.file_manager = file_manager
 
         self.chapter_dic = file_manager.chapter_dic
         self.lemmatized_chapter_dic = file_manager.lemmatized_chapter_dic
+        self.lemma_alignment_dic = file_manager.lemma_alignment_dic
         self.language = file_manager.language
+        self.chapter_languages = file_manager.chapter_languages
         self.resolved_chunked_chapter_dic = file_manager.resolved_chunked_chapter_dic
 
-        
-
-        if not self.chapter_dic:
+        # Streaming/incremental runs haven't lemmatized yet, front load the model variants they'll need
+        if self.config.spacy_warm_up_variants and self.language:
+            load_stats = SpacyLemmatizer.warm_up(self.language, self.config.spacy_warm_up_variants)
+            logger.info(f"spaCy variants warmed up: {load_stats}")
+
+        if self.config.incremental:
+            self._find_pending_chapters()
+
+        if self.config.corpus_store_dir:
+            # Later stages read paragraphs as slices of the memory mapped store instead of held strings
+            self.corpus_store = file_manager.build_corpus_store(self.config.corpus_store_dir)
+            self.resolved_chunked_chapter_dic = self.corpus_store
+            file_manager.resolved_chunked_chapter_dic = self.corpus_store
+
+        if self.config.streaming or self.config.incremental:
+            # Chapters are pulled lazily from file_manager.iter_chapters by later stages
+            if not file_manager.sorted_files:
+                raise RuntimeError("no chapter files found, likely no chapters inputted")
+        elif not self.chapter_dic:
             raise RuntimeError("chapter_dic non existent, likely no chapters inputted")
         
         logger.info(f"Discovered and lemmatised files")
+
+    def _find_pending_chapters(self) -> None:
+        """
+        Compares chapter hashes against the persisted manifest, only new or edited chapters are processed
+        When not streaming, stage 1 dicts are built for just those chapters
+        """
+        self.manifest = ChapterManifest(self.manifest_path)
+        self.chapter_hashes = self.file_manager.chapter_hashes()
+        self.removed_chapters = self.manifest.removed_chapters(self.chapter_hashes)
+        self.pending_chapters = self.manifest.pending_chapters(self.chapter_hashes, "entities")
+        self.manifest.update_hashes(self.chapter_hashes)
+        logger.info(
+            f"Incremental run: {len(self.pending_chapters)} new or changed chapters, "
+            f"{len(self.removed_chapters)} removed, {len(self.chapter_hashes) - len(self.pending_chapters)} unchanged"
+        )
+
+        if not self.config.streaming:
+            records = list(self.file_manager.iter_chapters(chapter_indices=self.pending_chapters))
+            self.chapter_dic = {record.chapter_idx: record.text for record in records}
+            self.lemmatized_chapter_dic = {record.chapter_idx: record.lemmatized_text for record in records}
+            self.lemma_alignment_dic = {record.chapter_idx: record.lemma_alignment for record in records}
+            self.resolved_chunked_chapter_dic = {record.chapter_idx: record.resolved_chunks for record in records}
+            self.file_manager.chapter_dic = self.chapter_dic
+            self.file_manager.lemmatized_chapter_dic = self.lemmatized_chapter_dic
+            self.file_manager.lemma_alignment_dic = self.lemma_alignment_dic
+            self.file_manager.resolved_chunked_chapter_dic = self.resolved_chunked_chapter_dic
     
     async def _stage_2_extract_entities(self) -> None:
-        #TODO add loading entities
         '''
         Requires:
         - chapter_dic (chapters hashed by chapter index)
@@ -130,7 +253,65 @@ class TranslationPipeline:
         Outputs:
         - unified entities (list of unified entity objects)
         '''
-        entity_manager = EntityManager(self.chapter_dic, self.lemmatized_chapter_dic, self.language, self.config.use_extra_gemini_ner)
+        NERService.configure(
+            batch_size=self.config.ner_batch_size, backend=self.config.ner_backend, quantize=self.config.ner_quantize,
+            workers=self.config.ner_workers, torch_threads=self.config.ner_torch_threads
+        )
+        if self.config.use_extra_gemini_ner:
+            from src.entity_management.models.gemini_ner_nodel import Async_Gemini_NER_Model
+            self.ner_cascade = NERCascade(
+                Async_Gemini_NER_Model(max_concurrency=self.config.gemini_ner_concurrency),
+                score_threshold=self.config.ner_cascade_score_threshold,
+                escalate_all=not self.config.gemini_ner_cascade
+            )
+        if self.config.incremental:
+            self.entity_manager = self._merge_pending_entities()
+        elif self.config.streaming:
+            # Bounded memory, one chapter record held at a time, resolution is left for stage 3
+            chapter_records = self.file_manager.iter_chapters(lemmatize=True, resolve=False)
+            entity_manager = EntityManager.from_chapter_records(
+                chapter_records, self.language, self.config.use_extra_gemini_ner, ner_batch_size=self.config.ner_batch_size,
+                ner_cascade=self.ner_cascade
+            )
+            self.entity_manager = entity_manager
+        else:
+            entity_manager = EntityManager(
+                self.chapter_dic, self.lemmatized_chapter_dic, self.language, self.config.use_extra_gemini_ner,
+                ner_batch_size=self.config.ner_batch_size, lemma_alignment_dic=self.lemma_alignment_dic,
+                ner_cascade=self.ner_cascade
+            )
+            self.entity_manager = entity_manager
+        if self.ner_cascade is not None:
+            self.ner_cascade.report()
+
+    def _merge_pending_entities(self) -> EntityManager:
+        """
+        Loads the saved entities, drops occurrences from edited/removed chapters and runs NER on pending chapters only
+        """
+        if os.path.exists(self.entity_state_path):
+            entity_manager = EntityManager.load(
+                self.entity_state_path, self.language, self.config.use_extra_gemini_ner, ner_batch_size=self.config.ner_batch_size,
+                ner_cascade=self.ner_cascade
+            )
+        else:
+            entity_manager = EntityManager({}, {}, self.language, self.config.use_extra_gemini_ner, ner_batch_size=self.config.ner_batch_size,
+                                           ner_cascade=self.ner_cascade)
+        entity_manager.remove_chapters(self.pending_chapters + self.removed_chapters)
+
+        if self.config.streaming:
+            chapter_records = self.file_manager.iter_chapters(lemmatize=True, resolve=False, chapter_indices=self.pending_chapters)
+            entity_manager.add_chapter_records(chapter_records)
+        elif self.pending_chapters:
+            entity_manager.add_chapters({chapter_idx: (self.chapter_dic[chapter_idx], self.lemmatized_chapter_dic[chapter_idx],
+                                                       self.lemma_alignment_dic.get(chapter_idx))
+                                         for chapter_idx in self.pending_chapters})
+        entity_manager.update_cutoffs()
+
+        entity_manager.save(self.entity_state_path)
+        self.manifest.mark_stage(self.pending_chapters, "entities")
+        self.manifest.save()
+        logger.info(f"Merged entities from {len(self.pending_chapters)} chapters, {len(entity_manager.touched_entities)} entities touched")
+        return entity_manager
 
     async def _stage_3_relation_extraction(self) -> None:
         '''
@@ -216,7 +397,12 @@ class TranslationPipeline:
         self.entity_matcher = Entity_Matcher(self.glossary, self.chapter_keyed_chunks)
         
         # Get processed chunks with entity matches
-        self.chapter_keyed_chunks = self.entity_matcher.get_matches()
+        self.chapter_keyed_chunks = self.entity_matcher.get_matches(
+            inline=self.config.inline_annotations, workers=self.config.annotation_workers
+        )
+        if self.config.annotation_store_path:
+            # sidecar spans next to the untouched text, AnnotationStore.load(...).render_chapters re-tags it
+            self.entity_matcher.get_annotations().save(self.config.annotation_store_path)
         
         logger.info("Entity matching completed")
     
@@ -12,10 +12,11 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
-from google.genai.types import EmbedContentConfig
 from llama_index.llms.gemini import Gemini
 from llama_index.core.schema import NodeRelationship
+from ..data_manager.text_span import TextSpan
+from ..data_manager.lemmatizer import SpacyLemmatizer
+from .cached_embedding import CachedEmbedding
 from .ingestion import Ingestion
 from .retriever import Retriever
 from .termbase import TermBaseBuilder
@@ -45,14 +46,8 @@ class RAGDatabase:
         try:
             llm = Gemini(model="gemini-2.5-flash-lite", api_key=google_api_key)
 
-            embed_model = GoogleGenAIEmbedding(
-                model_name = Model_Utility_Class.RAG_EMBEDDING_MODEL, 
-                api_key=google_api_key,
-                embedding_config=EmbedContentConfig(
-                    output_dimensionality=768, ## can decrease later
-                    task_type = "SEMANTIC_SIMILARITY"
-                )
-            )
+            # every embedding, the test one included, goes through the response cache
+            embed_model = CachedEmbedding.google(google_api_key)
 
             test_embed_str = "This is a small test string to verify the embedding model is working correctly."
             test_embed_val = embed_model.get_text_embedding(test_embed_str)
@@ -99,6 +94,8 @@ class RAGDatabase:
         return self.termbase.build_entry(term, self.llm, chapter_idx=chapter_idx)
 
     def build_JSON_term_entries(self, entity_list, chapter_idx=None):
+        # one batched pass fills the lemma cache, parse_response then hits it per term
+        SpacyLemmatizer.lemmatize_entities(list(entity_list))
         data = []
         for entity in entity_list:
             self.llm = Gemini(
@@ -124,6 +121,7 @@ class RAGDatabase:
     
     def retrieve_chunks(self):
         # returns a hashmap of lists, entry is chapter, each list is an ordered node
+        # nodes come back as TextSpans over the node text, keeping their offsets in the source chapter
         all_nodes = list(self.index.docstore.docs.values())
 
         if not all_nodes:
@@ -155,7 +153,8 @@ class RAGDatabase:
             current = start_node
             # if the next node doesn't exists break early
             while current:
-                ordered_chunk_list.append(current.text)
+                start = current.start_char_idx or 0
+                ordered_chunk_list.append(TextSpan(chapter_idx, start, start + len(current.text), current.text, source_offset=start))
                 next = current.relationships.get(NodeRelationship.NEXT)
                 if not next:
                     # no next chunk exists
@@ -0,0 +1,105 @@
+# src/rag_database/cached_embedding.py
+
+from typing import Any, List
+
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
+from google.genai.types import EmbedContentConfig
+
+try:
+    from ..utils.model_settings import Model_Utility_Class
+    from ..utils.response_cache import ResponseCache
+except ImportError:
+    from src.utils.model_settings import Model_Utility_Class
+    from src.utils.response_cache import ResponseCache
+
+
+class CachedEmbedding(BaseEmbedding):
+    '''
+    Wraps an embedding model so query and text embeddings go through the ResponseCache,
+    whichever llama_index component (splitter, index, retriever) asks for them
+    '''
+    inner: Any = Field(description="The wrapped embedding model that is called on a cache miss.")
+
+    def __init__(self, inner: BaseEmbedding, **kwargs: Any):
+        super().__init__(
+            inner=inner,
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @classmethod
+    def google(cls, api_key):
+        '''
+        The Gemini embedding model used for chunking, indexing and retrieval, wrapped in the cache
+        '''
+        return cls(GoogleGenAIEmbedding(
+            model_name=Model_Utility_Class.RAG_EMBEDDING_MODEL,
+            api_key=api_key,
+            embedding_config=EmbedContentConfig(
+                output_dimensionality=768, ## can decrease later
+                task_type="SEMANTIC_SIMILARITY"
+            )
+        ))
+
+    def _params(self):
+        return {"class": type(self.inner).__name__, "config": repr(getattr(self.inner, "embedding_config", None))}
+
+    def _cached(self, template, texts, embed):
+        '''
+        Looks every text up under template and embeds only the misses, in one call to embed
+        '''
+        cache = ResponseCache.shared()
+        if cache is None:
+            return embed(texts)
+        params = self._params()
+        embeddings = [cache.get(self.model_name, template, text, params) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = embed([texts[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+                cache.put(self.model_name, template, texts[i], embedding, params)
+        return embeddings
+
+    async def _acached(self, template, texts, aembed):
+        cache = ResponseCache.shared()
+        if cache is None:
+            return await aembed(texts)
+        params = self._params()
+        embeddings = [cache.get(self.model_name, template, text, params) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = await aembed([texts[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+                cache.put(self.model_name, template, texts[i], embedding, params)
+        return embeddings
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._cached("embedding_query", [query], lambda texts: [self.inner._get_query_embedding(texts[0])])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        async def aembed(texts):
+            return [await self.inner._aget_query_embedding(texts[0])]
+        return (await self._acached("embedding_query", [query], aembed))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._cached("embedding", [text], lambda texts: [self.inner._get_text_embedding(texts[0])])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        async def aembed(texts):
+            return [await self.inner._aget_text_embedding(texts[0])]
+        return (await self._acached("embedding", [text], aembed))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._cached("embedding", texts, self.inner._get_text_embeddings)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._acached("embedding", texts, self.inner._aget_text_embeddings)
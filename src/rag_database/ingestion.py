@@ -11,9 +11,7 @@ from llama_index.core.embeddings import BaseEmbedding
 from llama_index.core.node_parser import SemanticSplitterNodeParser
 
 
-from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
-from google.genai.types import EmbedContentConfig
-
+from .cached_embedding import CachedEmbedding
 
 try:
     from ..utils.model_settings import Model_Utility_Class
@@ -58,14 +56,7 @@ class Ingestion:
         for raw_doc in raw_docs:
             log(f"starting semantic splitting for raw_doc")
             node_parser = SemanticSplitterNodeParser.from_defaults(
-                embed_model = GoogleGenAIEmbedding(
-                    model_name = Model_Utility_Class.RAG_EMBEDDING_MODEL, 
-                    api_key=Model_Utility_Class.get_next_key(Model_Utility_Class.RAG_EMBEDDING_MODEL),
-                    embedding_config=EmbedContentConfig(
-                        output_dimensionality=768, ## can decrease later
-                        task_type = "SEMANTIC_SIMILARITY"
-                    )
-                ),
+                embed_model = CachedEmbedding.google(Model_Utility_Class.get_next_key(Model_Utility_Class.RAG_EMBEDDING_MODEL)),
                 breakpoint_percentile_threshold=85, # this takes an int out of 100, default 95, decrease to make finer
                 include_metadata=True,
                 include_prev_next_rel=True,
@@ -80,19 +71,18 @@ class Ingestion:
 
         api_call_count = 0
 
-        # Generate embeddings in parallel
+        # Generate embeddings in parallel, the embed model serves unchanged nodes from the response cache
         async def embed_node(node):
             nonlocal api_call_count
             api_call_count += 1
             current_call = api_call_count
             log(f"Sending embedding API call #{current_call}")
             start_time = time.time()
-            embedding = await asyncio.to_thread(
+            node.embedding = await asyncio.to_thread(
                 embed_model.get_text_embedding,
                 node.get_content(metadata_mode="all")
             )
             elapsed = time.time() - start_time
-            node.embedding = embedding
             log(f"Received response for API call #{current_call} (took {elapsed:.2f}s)")
             return node
 
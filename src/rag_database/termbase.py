@@ -1,4 +1,24 @@
+import json
+
 from ..data_manager.lemmatizer import SpacyLemmatizer
+from ..utils.response_cache import ResponseCache
+
+TERM_ENTRY_PROMPT = ( # maybe modify this prompt later
+    "Context:\n{context_text}\n\n"
+    "Your task is to act as a highly knowledgeable linguist, summarising this entity for knowledge recall as part of a RAG system. "
+    "Analyze the provided 'Context' thoroughly to understand the usage, nuances, and specific implications of the 'Term'. "
+    "Then, for the given term, provide a detailed and comprehensive description. "
+    "Ensure the description includes its primary meaning, any specific connotations or cultural relevance within the provided context, and its functional role or significance. "
+    "After providing the description, give a precise and contextually appropriate English target translation. "
+    "The translation MUST meticulously fit the overall context, the author's unique style, and their specific authorial intent."
+    "\n\n"
+    "Term: \"{entity}\"\n\n"
+    "Please output ONLY the following fields exactly as shown, nothing else. "
+    "Maintain the exact field names and order. Format the output as plain text, not JSON or any other markup.\n"
+    "description: [Provide a detailed, multi-sentence description based on the context. Focus on meaning, connotations, and functional role. Aim for 3-5 sentences minimum.]\n"
+    "term type: [Identify the grammatical or categorical type of the term, e.g., Title, Concept, Character Name, Item, Ability, Location, Event, etc. Only one type.]\n"
+    "english target translation: [Provide the most accurate and contextually appropriate English translation.]\n"
+)
 
 class TermBaseBuilder:
     def __init__(self, retriever):
@@ -48,25 +68,19 @@ class TermBaseBuilder:
             }
 
         context_text = "\n\n".join(chunks)
-        prompt = ( # maybe modify this prompt later
-            f"Context:\n{context_text}\n\n"
-            "Your task is to act as a highly knowledgeable linguist, summarising this entity for knowledge recall as part of a RAG system. "
-            "Analyze the provided 'Context' thoroughly to understand the usage, nuances, and specific implications of the 'Term'. "
-            "Then, for the given term, provide a detailed and comprehensive description. "
-            "Ensure the description includes its primary meaning, any specific connotations or cultural relevance within the provided context, and its functional role or significance. "
-            "After providing the description, give a precise and contextually appropriate English target translation. "
-            "The translation MUST meticulously fit the overall context, the author's unique style, and their specific authorial intent."
-            "\n\n"
-            f"Term: \"{entity}\"\n\n"
-            "Please output ONLY the following fields exactly as shown, nothing else. "
-            "Maintain the exact field names and order. Format the output as plain text, not JSON or any other markup.\n"
-            "description: [Provide a detailed, multi-sentence description based on the context. Focus on meaning, connotations, and functional role. Aim for 3-5 sentences minimum.]\n"
-            "term type: [Identify the grammatical or categorical type of the term, e.g., Title, Concept, Character Name, Item, Ability, Location, Event, etc. Only one type.]\n"
-            "english target translation: [Provide the most accurate and contextually appropriate English translation.]\n"
-        )
-        
-        response = llm.complete(prompt)
-        return self.parse_response(response.text, entity, chapter_idx)  # Access .text from the response object
+        prompt = TERM_ENTRY_PROMPT.format(context_text=context_text, entity=entity)
+
+        # the same term with the same retrieved context is served from the response cache
+        cache = ResponseCache.shared()
+        model = getattr(llm, "model", type(llm).__name__)
+        cache_input = json.dumps([entity, context_text], ensure_ascii=False)
+        params = {"temperature": getattr(llm, "temperature", None), "max_tokens": getattr(llm, "max_tokens", None)}
+        response_text = cache.get(model, TERM_ENTRY_PROMPT, cache_input, params) if cache is not None else None
+        if response_text is None:
+            response_text = llm.complete(prompt).text  # Access .text from the response object
+            if cache is not None:
+                cache.put(model, TERM_ENTRY_PROMPT, cache_input, response_text, params)
+        return self.parse_response(response_text, entity, chapter_idx)
 
     def parse_response(self, resp, entity, chapter_idx=None):
         """
@@ -0,0 +1,79 @@
+from lingua import Language, LanguageDetectorBuilder
+
+class LanguageDetector:
+    '''
+    Shared lingua detector, built once on first use instead of per caller
+    Detection only looks at fixed size windows of text so its cost is constant in chapter length
+    '''
+    # can add more later, what space has curently
+    languages = [
+        Language.ENGLISH,
+        Language.CHINESE,
+        Language.JAPANESE,
+        Language.KOREAN,
+        Language.SPANISH,
+        Language.FRENCH
+    ]
+
+    # Characters looked at per text, and how many texts a sampled detection draws from
+    SAMPLE_CHARS = 1000
+    SAMPLE_TEXTS = 5
+
+    _detector = None
+
+    @classmethod
+    def get_detector(cls):
+        """Lazy build the detector, building loads lingua's models so is only done once"""
+        if cls._detector is None:
+            cls._detector = LanguageDetectorBuilder.from_languages(*cls.languages).build()
+        return cls._detector
+
+    @staticmethod
+    def sample_text(text, sample_chars=SAMPLE_CHARS):
+        """
+        Fixed size window from the middle of the text, skips front matter like titles and author notes
+        Window edges are moved to whitespace so words aren't cut in half where possible
+        """
+        if len(text) <= sample_chars:
+            return text
+        start = (len(text) - sample_chars) // 2
+        end = start + sample_chars
+        space = text.find(" ", start, start + 50)
+        if space != -1:
+            start = space + 1
+        space = text.rfind(" ", end - 50, end)
+        if space != -1:
+            end = space
+        return text[start:end]
+
+    @classmethod
+    def detect(cls, text, sample_chars=SAMPLE_CHARS):
+        """Detects the language of a single text from a sample window, None if undetectable"""
+        if not text:
+            return None
+        return cls.get_detector().detect_language_of(cls.sample_text(text, sample_chars))
+
+    @classmethod
+    def detect_sampled(cls, texts, sample_chars=SAMPLE_CHARS, sample_texts=SAMPLE_TEXTS):
+        """
+        Detects one language over many texts (e.g. chapters) from windows of a few evenly spaced ones
+        Returns (language, confidence), confidence is lingua's relative confidence between 0 and 1
+        """
+        texts = [text for text in texts if text]
+        if not texts:
+            return None, 0.0
+
+        step = max(1, len(texts) // sample_texts)
+        chosen = texts[::step][:sample_texts]
+        per_text_chars = max(1, sample_chars // len(chosen))
+        sample = "\n".join(cls.sample_text(text, per_text_chars) for text in chosen)
+
+        confidence_values = cls.get_detector().compute_language_confidence_values(sample)
+        if not confidence_values or confidence_values[0].value == 0:
+            return None, 0.0
+        return confidence_values[0].language, confidence_values[0].value
+
+    @classmethod
+    def tag_chapters(cls, chapter_dic, sample_chars=SAMPLE_CHARS):
+        """Per chapter language tags, for uploads that mix languages"""
+        return {chapter_idx: cls.detect(text, sample_chars) for chapter_idx, text in chapter_dic.items()}
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+
+class ResponseCache():
+    '''
+    Persistent on-disk cache of LLM and embedding responses, shared by every model wrapper
+    Entries are keyed by model + prompt template hash + input hash + generation params hash,
+    so reruns over an unchanged book are served from disk instead of paid API calls
+    Expired (ttl) entries are dropped on read, least recently used entries go once max_entries is passed
+    '''
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        model TEXT NOT NULL,
+        template_hash TEXT NOT NULL,
+        input_hash TEXT NOT NULL,
+        params_hash TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (model, template_hash, input_hash, params_hash)
+    )
+    """
+    INDEX = "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+
+    _shared = None
+    _shared_lock = threading.Lock()
+    settings = {"enabled": True, "db_path": None, "ttl_seconds": None, "max_entries": None}
+
+    def __init__(self, db_path, ttl_seconds=None, max_entries=None):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # embedding calls run in worker threads, so the connection is shared behind a lock
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute(self.SCHEMA)
+        self.connection.execute(self.INDEX)
+        self.connection.commit()
+        self.lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    @classmethod
+    def configure(cls, enabled=True, db_path=None, ttl_seconds=None, max_entries=None):
+        '''
+        Settings of the shared cache, a cache already open with other settings is closed
+        '''
+        with cls._shared_lock:
+            cls.settings = {"enabled": enabled, "db_path": db_path, "ttl_seconds": ttl_seconds, "max_entries": max_entries}
+            if cls._shared is not None:
+                cls._shared.close()
+                cls._shared = None
+
+    @classmethod
+    def shared(cls):
+        '''
+        The process wide cache, None when caching is disabled
+        '''
+        with cls._shared_lock:
+            if not cls.settings["enabled"]:
+                return None
+            if cls._shared is None:
+                db_path = cls.settings["db_path"]
+                if db_path is None:
+                    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+                    db_path = os.path.join(project_root, "data", "cache", "responses.sqlite")
+                cls._shared = cls(db_path, cls.settings["ttl_seconds"], cls.settings["max_entries"])
+            return cls._shared
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def hash_params(params):
+        return hashlib.sha256(json.dumps(params or {}, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _key(self, model, template, input_text, params):
+        return (model, self.hash_text(template), self.hash_text(input_text), self.hash_params(params))
+
+    def get(self, model, template, input_text, params=None):
+        '''
+        Returns the cached response or None, counting the hit/miss against the model
+        '''
+        key = self._key(model, template, input_text, params)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response, created_at FROM responses WHERE model=? AND template_hash=? AND input_hash=? AND params_hash=?",
+                key
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self.connection.execute(
+                    "DELETE FROM responses WHERE model=? AND template_hash=? AND input_hash=? AND params_hash=?", key
+                )
+                self.connection.commit()
+                row = None
+            if row is None:
+                self.misses[model] += 1
+                return None
+            self.connection.execute(
+                "UPDATE responses SET last_used=? WHERE model=? AND template_hash=? AND input_hash=? AND params_hash=?",
+                (now,) + key
+            )
+            self.connection.commit()
+            self.hits[model] += 1
+        return json.loads(row[0])
+
+    def put(self, model, template, input_text, response, params=None):
+        if response is None:
+            return
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._key(model, template, input_text, params) + (json.dumps(response, ensure_ascii=False), now, now)
+            )
+            if self.max_entries is not None:
+                self._evict_over_size()
+            self.connection.commit()
+
+    def _evict_over_size(self):
+        count = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def evict_expired(self):
+        '''
+        Drops every entry older than the ttl, returns the number removed
+        '''
+        if self.ttl_seconds is None:
+            return 0
+        with self.lock:
+            cursor = self.connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self.connection.commit()
+        return cursor.rowcount
+
+    def stats(self):
+        models = set(self.hits) | set(self.misses)
+        stats = {}
+        for model in sorted(models):
+            total = self.hits[model] + self.misses[model]
+            stats[model] = {"hits": self.hits[model], "misses": self.misses[model],
+                            "hit_rate": self.hits[model] / total if total else 0.0}
+        return stats
+
+    def report(self):
+        for model, counts in self.stats().items():
+            self.logger.info(f"Response cache [{model}]: {counts['hits']} hits, {counts['misses']} misses ({counts['hit_rate']:.1%} hit rate)")
+        return self.stats()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test script for the columnar annotation sidecar store.
+Checks that spans survive a save/load round trip and render the same inline markers.
+"""
+
+import os
+import sys
+import tempfile
+
+from src.entity_management.annotation_store import AnnotationStore
+
+
+def test_round_trip_and_render():
+    """Saved spans should load back unchanged and render the inline tagged text."""
+    store = AnnotationStore([("Klein", "Klein"), ("廷根", "Tingen")])
+    segments = {1: ["Klein walked.", "Nothing here."], 2: ["克莱恩来到廷根"]}
+    store.add_segment(1, 0, [(0, 5, 0)])
+    store.add_segment(1, 1, [])
+    store.add_segment(2, 0, [(5, 7, 1)])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "annotations.zip")
+        store.save(path)
+        loaded = AnnotationStore.load(path)
+
+    assert len(loaded) == 2
+    assert loaded.segment_spans(1, 0) == [(0, 5, 0)]
+    assert loaded.chapter_spans(1) == {0: [(0, 5, 0)], 1: []}
+    assert loaded.render_chapters(segments) == {
+        1: ["Klein [Klein translates to Klein] walked.", "Nothing here."],
+        2: ["克莱恩来到廷根 [廷根 translates to Tingen]"]
+    }
+    print("Annotation store round trip passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_round_trip_and_render()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
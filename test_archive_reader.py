@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for reading chapters out of EPUB archives.
+Builds a small EPUB with an image only cover page and checks that only text chapters become chapters,
+and a ZIP of several volumes to check the entry order.
+"""
+
+import os
+import sys
+import zipfile
+import tempfile
+
+from src.data_manager.archive_reader import ArchiveReader
+
+CONTAINER = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+PACKAGE = """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="cover" href="cover.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c1" href="text/chapter1.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c2" href="text/chapter2.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine><itemref idref="nav"/><itemref idref="cover"/><itemref idref="c1"/><itemref idref="c2"/></spine>
+</package>"""
+
+COVER = '<html><body><div><img src="cover.jpg" alt=""/></div></body></html>'
+CHAPTER = "<html><head><title>{title}</title></head><body><h1>{title}</h1><p>{body}</p></body></html>"
+
+
+def write_epub(path):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("mimetype", "application/epub+zip")
+        archive.writestr("META-INF/container.xml", CONTAINER)
+        archive.writestr("OEBPS/content.opf", PACKAGE)
+        archive.writestr("OEBPS/nav.xhtml", "<html><body><nav><p>Contents</p></nav></body></html>")
+        archive.writestr("OEBPS/cover.xhtml", COVER)
+        archive.writestr("OEBPS/text/chapter1.xhtml", CHAPTER.format(title="Chapter 1", body="Klein opened his eyes."))
+        archive.writestr("OEBPS/text/chapter2.xhtml", CHAPTER.format(title="Chapter 2", body="The crimson moon rose."))
+
+
+def test_epub_chapters():
+    """The cover page and nav document should not come out as chapters."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.epub")
+        write_epub(path)
+        with ArchiveReader(path) as archive:
+            assert archive.entries == ["OEBPS/cover.xhtml", "OEBPS/text/chapter1.xhtml", "OEBPS/text/chapter2.xhtml"]
+            texts = [archive.read_entry(name) for name in archive.entries]
+            assert [ArchiveReader.has_text(text) for text in texts] == [False, True, True]
+            assert texts[1] == "Chapter 1\n\nKlein opened his eyes."
+        assert archive.zip_file.fp is None
+    print("EPUB chapter reading passed")
+
+
+def test_zip_volume_order():
+    """Entries sort by folder first, then chapter number, so volumes don't interleave."""
+    names = ["Vol 10/Chapter 1.txt", "Vol 2/Chapter 10.txt", "Vol 2/Chapter 2.txt", "Vol 1/Chapter 2.txt", "Vol 1/Chapter 1.txt"]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.zip")
+        with zipfile.ZipFile(path, "w") as archive:
+            for name in names:
+                archive.writestr(name, name)
+
+        def chapter_number(name):
+            return int(name.rsplit(" ", 1)[1].split(".")[0])
+
+        with ArchiveReader(path, sort_key=chapter_number) as archive:
+            assert archive.entries == ["Vol 1/Chapter 1.txt", "Vol 1/Chapter 2.txt", "Vol 2/Chapter 2.txt",
+                                       "Vol 2/Chapter 10.txt", "Vol 10/Chapter 1.txt"]
+        with ArchiveReader(path) as archive:
+            assert archive.entries[:2] == ["Vol 1/Chapter 1.txt", "Vol 1/Chapter 2.txt"]
+    print("ZIP volume order passed")
+
+
+def test_file_manager_epub():
+    """FileManager should number only the text chapters of an EPUB, and close it afterwards."""
+    from src.data_manager.file_manager import FileManager
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "book.epub")
+        write_epub(path)
+        with FileManager(path, use_cache=False, streaming=True) as file_manager:
+            # the cover stays a source, it is only dropped once read
+            assert len(file_manager.sorted_files) == 3
+            records = list(file_manager.iter_chapters(lemmatize=False, resolve=False))
+            assert [record.chapter_idx for record in records] == [0, 1]
+            assert records[1].text == "Chapter 2\n\nThe crimson moon rose."
+            archive = file_manager._archives[path]
+        assert archive.zip_file.fp is None
+    print("FileManager EPUB expansion passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_epub_chapters()
+        test_zip_volume_order()
+        test_file_manager_epub()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
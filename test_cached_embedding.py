@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test script for the cached embedding model.
+Wraps a counting fake embedding and checks that queries, single texts and batches are served from the response cache.
+"""
+
+import os
+import sys
+import tempfile
+
+from llama_index.core.embeddings import BaseEmbedding
+
+from src.utils.response_cache import ResponseCache
+from src.rag_database.cached_embedding import CachedEmbedding
+
+
+class CountingEmbedding(BaseEmbedding):
+    """Embeds a text as its length, counting how many texts reach the model."""
+    calls: int = 0
+
+    def _embed(self, text):
+        self.calls += 1
+        return [float(len(text))]
+
+    def _get_query_embedding(self, query):
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query):
+        return self._embed(query)
+
+    def _get_text_embedding(self, text):
+        return self._embed(text)
+
+
+def test_cached_embeddings():
+    """A second run over the same texts makes no model calls, queries and texts are kept apart."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ResponseCache.configure(db_path=os.path.join(temp_dir, "responses.sqlite"))
+        try:
+            inner = CountingEmbedding(model_name="counting")
+            embed_model = CachedEmbedding(inner)
+
+            assert embed_model.get_text_embedding("Klein Moretti") == [13.0]
+            assert embed_model.get_text_embedding_batch(["Klein Moretti", "Tingen"]) == [[13.0], [6.0]]
+            assert inner.calls == 2
+
+            assert embed_model.get_query_embedding("Tingen") == [6.0]
+            assert embed_model.get_query_embedding("Tingen") == [6.0]
+            assert inner.calls == 3
+
+            # a fresh wrapper, as in the next run, reads everything from the cache
+            rerun = CachedEmbedding(CountingEmbedding(model_name="counting"))
+            assert rerun.get_text_embedding_batch(["Tingen", "Klein Moretti"]) == [[6.0], [13.0]]
+            assert rerun.get_query_embedding("Tingen") == [6.0]
+            assert rerun.inner.calls == 0
+        finally:
+            ResponseCache.configure()
+    print("Cached embedding passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_cached_embeddings()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
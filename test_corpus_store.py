@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script for the packed memory mapped corpus store.
+Checks that paragraphs and chapters read back from the blob match the chunked input.
+"""
+
+import sys
+import tempfile
+
+from src.data_manager.corpus_store import CorpusStore
+
+
+def test_round_trip():
+    """Paragraph slices and chapter text should reproduce the original chapters."""
+    chapter_dic = {
+        3: "Klein opened his eyes.\n\nThe crimson moon hung outside — 红月.",
+        4: "A single paragraph chapter.",
+        5: "",
+    }
+    chunked = {key: value.split("\n\n") for key, value in chapter_dic.items()}
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = CorpusStore.build(store_dir, chunked, signature="abc")
+        try:
+            assert list(store) == [3, 4, 5]
+            assert store.signature == "abc"
+            for key, paragraphs in chunked.items():
+                assert list(store[key]) == paragraphs
+                assert store.chapter_text(key) == chapter_dic[key]
+            assert store[3][-1] == "The crimson moon hung outside — 红月."
+            assert bytes(store.paragraph_bytes(4, 0)) == b"A single paragraph chapter."
+        finally:
+            store.close()
+
+        reopened = CorpusStore(store_dir)
+        try:
+            assert dict((key, list(value)) for key, value in reopened.items()) == chunked
+        finally:
+            reopened.close()
+    print("Corpus store round trip passed")
+
+
+def test_streamed_build():
+    """Building from a generator of (chapter_idx, paragraphs) pairs should work the same."""
+    chapters = ((i, [f"chapter {i} paragraph {j}" for j in range(3)]) for i in range(100))
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = CorpusStore.build(store_dir, chapters)
+        try:
+            assert len(store) == 100
+            assert store[99][2] == "chapter 99 paragraph 2"
+        finally:
+            store.close()
+    print("Corpus store streamed build passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_round_trip()
+        test_streamed_build()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test script for building entities with EntityManager from the repo root.
+Runs the NER model over a small chapter and checks the base and lemmatized entities.
+"""
+
+import sys
+
+from lingua import Language
+
+from src.entity_management.entity_manager import EntityManager
+from src.entity_management.title_pronoun_filter import NERFilter
+from src.data_manager.lemma_alignment import LemmaAlignment
+
+CHAPTER = "Klein Moretti walked through Tingen at night.\n\nLater, Klein Moretti wrote to Audrey Hall."
+
+
+def lemma_tokens(text):
+    """Whitespace tokens lowercased as stand in lemmas, punctuation split off."""
+    tokens = []
+    position = 0
+    for word in text.replace(",", " ,").replace(".", " .").split():
+        start = text.index(word, position)
+        tokens.append((word.lower(), start, start + len(word)))
+        position = start + len(word)
+    return tokens
+
+
+def test_title_filter_loads():
+    """The title and pronoun lists are found regardless of the working directory."""
+    assert NERFilter.isRemovable("Mr", Language.ENGLISH, False)
+    assert not NERFilter.isRemovable("Klein Moretti", Language.ENGLISH, False)
+    print("Title filter loads passed")
+
+
+def test_build_entities():
+    """Entities come back with their chapter positions, and are projected onto the lemmatized text."""
+    lemmatized_text, alignment = LemmaAlignment.from_lemma_tokens(lemma_tokens(CHAPTER))
+    entity_manager = EntityManager({1: CHAPTER}, {1: lemmatized_text}, Language.ENGLISH, False,
+                                   lemma_alignment_dic={1: alignment})
+
+    klein = entity_manager.base_entities_dic["Klein Moretti"]
+    assert klein.get_count(1) == 2
+    assert [CHAPTER[start:end] for start, end in klein.get_positions(1)] == ["Klein Moretti", "Klein Moretti"]
+    assert "Tingen" in entity_manager.base_entities_dic
+    assert entity_manager.largest_idx == 1
+
+    lemma_klein = entity_manager.lemmatized_entities_dic["klein moretti"]
+    assert [lemmatized_text[start:end] for start, end in lemma_klein.get_positions(1)] == ["klein moretti", "klein moretti"]
+    print("EntityManager build passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_title_filter_loads()
+        test_build_entities()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script for building an Entity_Matcher from RAG chunks.
+retrieve_chunks hands back TextSpans, the matcher should detect the language and tag them like plain strings.
+"""
+
+import sys
+from types import SimpleNamespace
+
+from llama_index.core.schema import TextNode, NodeRelationship, RelatedNodeInfo
+
+from src.rag_database.base_rag import RAGDatabase
+from src.data_manager.text_span import TextSpan
+from src.entity_management.entity_matcher_interfacer import Entity_Matcher
+
+CHAPTER = ("Klein Moretti woke up in a strange room, the crimson moon hanging outside the window.\n\n"
+           "He walked down to the street of Tingen, thinking about the diary he had found.")
+
+
+def build_index():
+    """Two linked nodes of one chapter, the way ingestion stores them."""
+    first_text, second_text = CHAPTER.split("\n\n")
+    second_start = len(first_text) + 2
+    first = TextNode(id_="a", text=first_text, metadata={"chapter_idx": 1}, start_char_idx=0, end_char_idx=len(first_text))
+    second = TextNode(id_="b", text=second_text, metadata={"chapter_idx": 1},
+                      start_char_idx=second_start, end_char_idx=second_start + len(second_text))
+    first.relationships[NodeRelationship.NEXT] = RelatedNodeInfo(node_id="b")
+    second.relationships[NodeRelationship.PREVIOUS] = RelatedNodeInfo(node_id="a")
+    return SimpleNamespace(docstore=SimpleNamespace(docs={"b": second, "a": first}))
+
+
+def test_matcher_from_retrieved_chunks():
+    """No target_language given, so the language is detected from the spans themselves."""
+    chunks = RAGDatabase.retrieve_chunks(SimpleNamespace(index=build_index()))
+    assert all(isinstance(segment, TextSpan) for segment in chunks[1])
+
+    glossary = [
+        {"entity": "Klein Moretti", "english target translation": "Klein Moretti", "lemmatized entity": "Klein Moretti"},
+        {"entity": "Tingen", "english target translation": "Tingen", "lemmatized entity": "Tingen"},
+    ]
+    matcher = Entity_Matcher(glossary, chunks)
+    assert matcher.target_language is not None
+
+    tagged = matcher.get_matches()
+    assert "[Klein Moretti translates to Klein Moretti]" in tagged[1][0]
+    hits = matcher.get_entity_hits()[1]
+    assert sorted(CHAPTER[span.start:span.end] for span, _ in hits) == ["Klein Moretti", "Tingen"]
+
+    # a second call rebuilds the hits and annotations instead of appending to them
+    assert matcher.get_matches() == tagged
+    assert len(matcher.get_entity_hits()[1]) == 2
+    assert len(matcher.get_annotations()) == 2
+    print("Entity_Matcher built from retrieved chunks passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_matcher_from_retrieved_chunks()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
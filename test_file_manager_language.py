@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Test script for FileManager on chapters without a detectable language.
+Numeric only chapters give no language, they should be kept unlemmatized instead of aborting the run.
+"""
+
+import os
+import sys
+import tempfile
+
+from src.data_manager.file_manager import FileManager
+
+
+def write_chapters(directory, chapters):
+    for i, text in enumerate(chapters, start=1):
+        with open(os.path.join(directory, f"chapter{i}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def test_undetectable_chapter():
+    """Eager mode keeps the original text when no spaCy model fits the language."""
+    chapters = ["12345 67890\n\n2024", "0 1 2 3"]
+    with tempfile.TemporaryDirectory() as directory:
+        write_chapters(directory, chapters)
+        with FileManager(directory, use_cache=False) as file_manager:
+            assert file_manager.language is None
+            assert file_manager.lemmatized_chapter_dic == {0: chapters[0], 1: chapters[1]}
+            assert file_manager.lemma_alignment_dic == {}
+            assert [span.text for span in file_manager.resolved_chunked_chapter_dic[0]] == ["12345 67890", "2024"]
+    print("Undetectable chapter (eager) passed")
+
+
+def test_undetectable_chapter_streaming():
+    """Streaming mode lemmatizes per chapter and should fall back the same way."""
+    chapters = ["12345 67890"]
+    with tempfile.TemporaryDirectory() as directory:
+        write_chapters(directory, chapters)
+        with FileManager(directory, use_cache=False, streaming=True) as file_manager:
+            record = next(file_manager.iter_chapters(resolve=False))
+            assert record.lemmatized_text == chapters[0]
+            assert record.lemma_alignment is None
+    print("Undetectable chapter (streaming) passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_undetectable_chapter()
+        test_undetectable_chapter_streaming()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for batched Gemini NER.
+Checks reply parsing, token budget packing and the split/fallback paths of _run_batch with a stubbed model call.
+"""
+
+import re
+import sys
+import asyncio
+
+from src.entity_management.models.gemini_ner_nodel import (
+    Async_Gemini_NER_Model, FIND_NAMED_ENTITIES_BATCHED_PROMPT, CHARS_PER_TOKEN,
+    load_prompt, parse_batched_response, pack_paragraphs
+)
+
+PARAGRAPH = re.compile(r'<p id="(\d+)">\n(.*?)\n</p>', re.DOTALL)
+
+
+def test_parse_batched_response():
+    """Fences, text around the object, CSV strings and "null" are tolerated, bad or missing ids are left out."""
+    raw = 'Sure:\n```json\n{"0": ["Klein", "null"], "1": "Tingen, Nighthawks", "2": 5}\n```'
+    assert parse_batched_response(raw, [0, 1, 2, 3]) == {0: ["Klein"], 1: ["Tingen", "Nighthawks"]}
+    assert parse_batched_response('{"0": [], }', [0]) == {}
+    assert parse_batched_response("no json here", [0]) == {}
+    assert parse_batched_response('["Klein"]', [0]) == {}
+    assert parse_batched_response(None, [0]) == {}
+    print("Batched reply parsing passed")
+
+
+def test_pack_paragraphs():
+    """Batches stay under the budget and in order, an oversized paragraph still gets a batch of its own."""
+    paragraphs = [(i, "x" * (CHARS_PER_TOKEN * 40)) for i in range(5)] + [(5, "y" * (CHARS_PER_TOKEN * 500))]
+    batches = pack_paragraphs(paragraphs, token_budget=100)
+    assert [[paragraph_id for paragraph_id, _ in batch] for batch in batches] == [[0, 1], [2, 3], [4], [5]]
+    assert pack_paragraphs([], token_budget=100) == []
+    print("Paragraph packing passed")
+
+
+class StubModel(Async_Gemini_NER_Model):
+    """Replies like Gemini would, except for the failures each test sets up."""
+    def __init__(self):
+        super().__init__()
+        self.batched_calls = []
+        self.single_calls = []
+
+    async def _generate(self, template, text):
+        if template != load_prompt(FIND_NAMED_ENTITIES_BATCHED_PROMPT):
+            self.single_calls.append(text)
+            return "Fallback"
+        paragraphs = [(int(paragraph_id), body) for paragraph_id, body in PARAGRAPH.findall(text)]
+        self.batched_calls.append([paragraph_id for paragraph_id, _ in paragraphs])
+        if len(paragraphs) == 4:
+            return "The reply was cut off {"
+        # paragraph 2 is never answered in a batch
+        return "{" + ", ".join(f'"{paragraph_id}": ["{body}"]' for paragraph_id, body in paragraphs if paragraph_id != 2) + "}"
+
+
+def test_run_batch_split_and_fallback():
+    """An unparseable batch splits in half, missing ids are retried, a lone failure uses the one paragraph prompt."""
+    model = StubModel()
+    texts = [f"Name{i}" for i in range(4)]
+    results = asyncio.run(model.get_entities_batched(texts, token_budget=6000))
+
+    assert results == [["Name0"], ["Name1"], ["Fallback"], ["Name3"]]
+    assert model.batched_calls == [[0, 1, 2, 3], [0, 1], [2, 3], [2]]
+    assert model.single_calls == ["Name2"]
+    print("Batch split and fallback passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_parse_batched_response()
+        test_pack_paragraphs()
+        test_run_batch_split_and_fallback()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test script for the Aho-Corasick glossary automaton.
+Compares its hits against the per entity \\b...\\b regex scan it replaces.
+"""
+
+import re
+import sys
+
+from src.entity_management.glossary_automaton import GlossaryAutomaton
+
+
+def regex_hits(text, entities):
+    """The old approach, one IGNORECASE word boundary regex per entity."""
+    hits = set()
+    for entity in entities:
+        for match in re.finditer(r'\b' + re.escape(entity) + r'\b', text, flags=re.IGNORECASE):
+            hits.add((match.start(), match.end(), entity))
+    return hits
+
+
+def test_matches_regex_scan():
+    """All hits, overlapping ones included, should equal the union of the per entity regex scans."""
+    entities = ["Klein", "Klein Moretti", "Moretti", "Tingen", "Crimson Lotus Slash", "Lotus", "Mr. A"]
+    text = ("Klein Moretti walked through Tingen. KLEIN used Crimson Lotus Slash, "
+            "not a lotus. Kleinish words and Tingens shouldn't match, Mr. A should.")
+    automaton = GlossaryAutomaton((entity, entity) for entity in entities)
+    assert set(automaton.find_all(text)) == regex_hits(text, entities)
+    print("Automaton agrees with regex scan")
+
+
+def test_longest_match_wins():
+    """Overlapping hits resolve to the longest entity, and results come back in text order."""
+    entities = ["Crimson Lotus", "Lotus Slash", "Crimson Lotus Slash", "Slash"]
+    text = "He used Crimson Lotus Slash then a Slash."
+    automaton = GlossaryAutomaton((entity, entity) for entity in entities)
+    matches = automaton.find_matches(text)
+    assert [payload for _, _, payload in matches] == ["Crimson Lotus Slash", "Slash"]
+    assert text[matches[0][0]:matches[0][1]] == "Crimson Lotus Slash"
+    print("Longest match wins")
+
+
+def test_without_word_boundaries():
+    """CJK text has no word boundaries, substrings should be found."""
+    automaton = GlossaryAutomaton([("克莱恩", "Klein"), ("廷根", "Tingen")], word_boundaries=False)
+    assert [payload for _, _, payload in automaton.find_matches("克莱恩来到廷根市")] == ["Klein", "Tingen"]
+    print("Matching without word boundaries passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_matches_regex_scan()
+        test_longest_match_wins()
+        test_without_word_boundaries()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
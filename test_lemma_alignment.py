@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Test script for the lemma alignment map.
+Checks that base text spans project onto the right lemma tokens.
+"""
+
+import sys
+
+from src.data_manager.lemma_alignment import LemmaAlignment
+
+
+def test_projection():
+    """Entity spans on the source should map to the lemmas of the tokens they cover."""
+    source = "Klein Moretti walked, then ran."
+    lemma_tokens = [("Klein", 0, 5), ("Moretti", 6, 13), ("walk", 14, 20), ("then", 22, 26), ("run", 27, 30)]
+    lemmatized_text, alignment = LemmaAlignment.from_lemma_tokens(lemma_tokens)
+
+    assert lemmatized_text == "Klein Moretti walk then run"
+    start, end = alignment.project(0, 13)
+    assert lemmatized_text[start:end] == "Klein Moretti"
+    start, end = alignment.project(source.index("ran"), source.index("ran") + 3)
+    assert lemmatized_text[start:end] == "run"
+    # the comma and space between tokens map to nothing
+    assert alignment.project(20, 22) is None
+
+    restored = LemmaAlignment.from_list(alignment.to_list())
+    assert restored.project(0, 13) == alignment.project(0, 13)
+    assert len(restored) == len(lemma_tokens)
+    print("Lemma alignment projection passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_projection()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
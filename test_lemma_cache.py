@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script for persisting the entity lemma cache.
+Checks that saved lemmas load back in LRU order and that lemmas from another spaCy model are discarded.
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+from src.data_manager.lemmatizer import SpacyLemmatizer
+
+
+def test_round_trip():
+    """Lemmas saved by one run are served to the next without running spaCy."""
+    SpacyLemmatizer.lemma_cache.clear()
+    model_key = SpacyLemmatizer._lemma_model_key("ENGLISH")
+    SpacyLemmatizer._cache_lemma("ENGLISH", model_key, "Knights of the Round Table", "knight of the round table")
+    SpacyLemmatizer._cache_lemma("ENGLISH", model_key, "Nighthawks", "nighthawk")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lemma_cache.json")
+        SpacyLemmatizer.save_lemma_cache(path)
+        SpacyLemmatizer.lemma_cache.clear()
+
+        assert SpacyLemmatizer.load_lemma_cache(path) == 2
+        assert list(SpacyLemmatizer.lemma_cache) == [
+            ("ENGLISH", model_key, "Knights of the Round Table"), ("ENGLISH", model_key, "Nighthawks")
+        ]
+        # served from the cache, no model is loaded for these
+        assert SpacyLemmatizer.lemmatize_entities(["Nighthawks", ""], "ENGLISH") == ["nighthawk", ""]
+    SpacyLemmatizer.lemma_cache.clear()
+    print("Lemma cache round trip passed")
+
+
+def test_stale_entries_discarded():
+    """Entries from another model version and files from before the model key are not loaded."""
+    SpacyLemmatizer.lemma_cache.clear()
+    model_key = SpacyLemmatizer._lemma_model_key("ENGLISH")
+    entries = [
+        ["ENGLISH", model_key, "Tingen", "tingen"],
+        ["ENGLISH", "en_core_web_lg==0.0.1/lemmatizer", "Backlund", "backlund"],
+        ["ENGLISH", "Audrey Hall", "audrey hall"],
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lemma_cache.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        assert SpacyLemmatizer.load_lemma_cache(path) == 1
+    assert list(SpacyLemmatizer.lemma_cache) == [("ENGLISH", model_key, "Tingen")]
+    SpacyLemmatizer.lemma_cache.clear()
+    print("Stale lemma entries discarded")
+
+
+if __name__ == "__main__":
+    try:
+        test_round_trip()
+        test_stale_entries_discarded()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test script for the multi token lemma trie used by glossary lemma matching.
+Lemma tokens are given directly as (lemma, start, end), so spaCy isn't needed.
+"""
+
+import sys
+
+from src.entity_management.lemma_trie import LemmaTrie
+
+
+def tokens_of(text, lemmas):
+    """Pairs each whitespace separated word with a lemma, offsets into text."""
+    tokens = []
+    position = 0
+    for word, lemma in zip(text.split(), lemmas):
+        start = text.index(word, position)
+        position = start + len(word)
+        tokens.append((lemma, start, position))
+    return tokens
+
+
+def test_multi_token_match():
+    """Inflected multi word terms should match, spans covering the source words."""
+    trie = LemmaTrie([("Crimson Lotus Slash", "slash"), ("lotus", "lotus"), ("Klein", "klein")])
+    text = "Klein used Crimson Lotuses Slashing"
+    lemma_tokens = tokens_of(text, ["Klein", "use", "crimson", "lotus", "slash"])
+    hits = trie.find_all(lemma_tokens)
+    assert (0, 5, "klein") in hits
+    assert (11, 35, "slash") in hits
+    assert (19, 26, "lotus") in hits
+    assert len(hits) == 3
+    print("Multi token lemma match passed")
+
+
+def test_first_entry_wins():
+    """Two glossary entries with the same lemma keep the first payload."""
+    trie = LemmaTrie([("run", "first"), ("Run", "second"), ("", "empty"), (None, "missing")])
+    assert len(trie) == 1
+    assert trie.find_all([("run", 0, 3)]) == [(0, 3, "first")]
+    print("First entry wins passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_multi_token_match()
+        test_first_entry_wins()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test script for the confidence gated NER cascade.
+Checks which paragraphs are escalated to Gemini and how Gemini's names are placed back into the chapter.
+"""
+
+import sys
+import asyncio
+
+from src.entity_management.ner_cascade import NERCascade
+from src.entity_management.entity_types.occurrence import Occurrence
+
+
+class FakeGemini():
+    """Returns fixed entities per paragraph and records the event loop every call ran on."""
+    def __init__(self, entities):
+        self.entities = entities
+        self.paragraphs = []
+        self.loops = []
+
+    async def get_entities_batched(self, texts, token_budget=6000):
+        self.loops.append(asyncio.get_running_loop())
+        self.paragraphs.extend(texts)
+        return [list(self.entities) for _ in texts]
+
+    async def get_entities_batch(self, texts):
+        return await self.get_entities_batched(texts)
+
+
+def hit(text, surface, score=0.99, label="PER"):
+    start = text.index(surface)
+    return Occurrence(surface, label, start, start + len(surface), score)
+
+
+def test_escalation_rules():
+    """Low scores, unseen local hits and untagged capitalised n-grams escalate, trusted paragraphs are skipped."""
+    paragraphs = [
+        "Klein Moretti looked at the diary.",      # new local hit
+        "Klein Moretti closed the diary.",         # same hit, now known
+        "The door opened. It was late.",           # sentence start capitals only
+        "Old Neil was waiting.",                   # low confidence hit
+        "They walked past the Black Thorn office.",  # capitalised n-gram the local model missed
+        "Tingen was quiet.",                       # known entity, untagged but known
+    ]
+    text = "\n\n".join(paragraphs)
+    second = text.index(paragraphs[1])
+    local = [
+        hit(text, "Klein Moretti"),
+        Occurrence("Klein Moretti", "PER", second, second + len("Klein Moretti"), 0.99),
+        hit(text, "Old Neil", score=0.4),
+    ]
+    cascade = NERCascade(FakeGemini([]))
+    escalated = cascade.select_paragraphs({7: text}, {7: local}, {"Old Neil", "Tingen"})
+
+    assert [paragraph for _, _, paragraph in escalated] == [paragraphs[0], paragraphs[3], paragraphs[4]]
+    assert all(text[start:start + len(paragraph)] == paragraph for _, start, paragraph in escalated)
+    stats = cascade.stats()
+    assert stats == {"paragraphs": 6, "escalated": 3, "skipped": 3,
+                     "reasons": {"new_entity": 1, "low_confidence": 1, "unknown_ngram": 1}}
+    assert cascade.report() == stats
+    print("Escalation rules passed")
+
+
+def test_escalate_all():
+    """escalate_all sends every paragraph, which is the behaviour without the cascade."""
+    cascade = NERCascade(FakeGemini([]), escalate_all=True)
+    escalated = cascade.select_paragraphs({1: "a quiet line.\n\nanother one."}, {}, set())
+    assert len(escalated) == 2 and cascade.stats()["reasons"] == {"all": 2}
+    print("Escalate all passed")
+
+
+def test_located_entities():
+    """Gemini names become chapter absolute Occurrences, outside local hits, longest name first, whole words only."""
+    text = "Klein Moretti met Audrey.\n\nAudrey Hall smiled at Klein, Audreyish as ever."
+    local = [hit(text, "Klein Moretti")]
+    cascade = NERCascade(FakeGemini(["Klein", "Klein Moretti", "Audrey", "Audrey Hall"]), escalate_all=True)
+    extra = cascade.find_extra_entities({2: text}, {2: local}, set())
+
+    located = [(occurrence.surface, text[occurrence.start:occurrence.end]) for occurrence in extra[2]]
+    assert located == [("Audrey", "Audrey"), ("Audrey Hall", "Audrey Hall"), ("Klein", "Klein")]
+    assert all(occurrence.label == "LLM" for occurrence in extra[2])
+    cascade.close()
+    print("Gemini entities located passed")
+
+
+def test_one_event_loop():
+    """Every call runs on the same loop, also when called from inside a running loop, so clients stay bound to it."""
+    gemini = FakeGemini(["Tingen"])
+    cascade = NERCascade(gemini, escalate_all=True)
+    cascade.find_extra_entities({1: "Tingen at night."}, {}, set())
+
+    async def from_pipeline():
+        return cascade.find_extra_entities({2: "Tingen by day."}, {}, set())
+
+    extra = asyncio.run(from_pipeline())
+    assert extra[2][0].surface == "Tingen"
+    assert len(gemini.loops) == 2 and gemini.loops[0] is gemini.loops[1]
+    cascade.close()
+    assert gemini.loops[0].is_closed()
+    print("Single event loop passed")
+
+
+def test_nothing_escalated():
+    """No Gemini call at all when every paragraph is trusted."""
+    gemini = FakeGemini(["Tingen"])
+    cascade = NERCascade(gemini)
+    extra = cascade.find_extra_entities({1: "he slept.\n\nshe read."}, {}, set())
+    assert extra == {1: []} and gemini.paragraphs == []
+    print("Nothing escalated passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_escalation_rules()
+        test_escalate_all()
+        test_located_entities()
+        test_one_event_loop()
+        test_nothing_escalated()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
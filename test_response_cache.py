@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent LLM/embedding response cache.
+Checks keying, size based eviction, ttl expiry and hit rate stats.
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from src.utils.response_cache import ResponseCache
+
+
+def test_keying_and_eviction():
+    """Responses are keyed on model, template, input and params, least recently used go first."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResponseCache(os.path.join(temp_dir, "responses.sqlite"), max_entries=2)
+        try:
+            cache.put("gemini", "template", "paragraph one", "Klein, Tingen")
+            cache.put("gemini", "template", "paragraph two", [0.1, 0.2])
+            assert cache.get("gemini", "template", "paragraph one") == "Klein, Tingen"
+            assert cache.get("gemini", "other template", "paragraph one") is None
+            assert cache.get("gemini", "template", "paragraph one", {"temperature": 0.5}) is None
+
+            # paragraph two is now the least recently used entry
+            cache.put("gemini", "template", "paragraph three", "Audrey")
+            assert cache.get("gemini", "template", "paragraph two") is None
+            assert cache.get("gemini", "template", "paragraph three") == "Audrey"
+
+            stats = cache.stats()["gemini"]
+            assert stats["hits"] == 2 and stats["misses"] == 3
+            assert abs(stats["hit_rate"] - 0.4) < 1e-9
+        finally:
+            cache.close()
+    print("Response cache keying and eviction passed")
+
+
+def test_ttl_expiry():
+    """Entries older than the ttl are dropped on read."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResponseCache(os.path.join(temp_dir, "responses.sqlite"), ttl_seconds=0.05)
+        try:
+            cache.put("embedding-001", "embedding", "text", [1.0])
+            assert cache.get("embedding-001", "embedding", "text") == [1.0]
+            time.sleep(0.1)
+            assert cache.get("embedding-001", "embedding", "text") is None
+        finally:
+            cache.close()
+    print("Response cache ttl passed")
+
+
+if __name__ == "__main__":
+    try:
+        test_keying_and_eviction()
+        test_ttl_expiry()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)